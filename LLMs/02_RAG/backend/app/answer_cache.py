@@ -0,0 +1,106 @@
+import threading
+import time
+from collections import OrderedDict
+import faiss
+import numpy as np
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(question.lower().split()).strip(" ?!.")
+
+
+class AnswerCache:
+    # Two tiers: exact match on the normalised question, then cosine similarity of question embeddings
+    def __init__(self, dim: int, max_entries: int = 1000, ttl_seconds: float = 3600,
+                 similarity_threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.lock = threading.Lock()
+
+        self.entries = OrderedDict()  # normalised question -> (id, created, value), in LRU order
+        self.keys_by_id = {}
+        self.next_id = 0
+        self.semantic_index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        self.version = None
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def sync(self, version):
+        # Cached answers are only valid for the knowledge index they were generated from
+        with self.lock:
+            if version != self.version:
+                self._clear()
+                self.version = version
+
+    def get(self, question: str):
+        with self.lock:
+            value = self._lookup(normalize_question(question))
+            if value is not None:
+                self.exact_hits += 1
+            return value
+
+    def get_similar(self, question_embedding):
+        with self.lock:
+            if self.semantic_index.ntotal:
+                scores, ids = self.semantic_index.search(self._normalize(question_embedding), 1)
+                if ids[0][0] != -1 and scores[0][0] >= self.similarity_threshold:
+                    value = self._lookup(self.keys_by_id[ids[0][0]])
+                    if value is not None:
+                        self.semantic_hits += 1
+                        return value
+            self.misses += 1
+            return None
+
+    def put(self, question: str, question_embedding, value):
+        key = normalize_question(question)
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            entry_id = self.next_id
+            self.next_id += 1
+            self.entries[key] = (entry_id, time.monotonic(), value)
+            self.keys_by_id[entry_id] = key
+            self.semantic_index.add_with_ids(self._normalize(question_embedding), np.array([entry_id], dtype="int64"))
+
+            # Evict least recently used entries
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+            }
+
+    def _lookup(self, key: str):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        _, created, value = entry
+        if time.monotonic() - created > self.ttl_seconds:
+            self._remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def _remove(self, key: str):
+        entry_id, _, _ = self.entries.pop(key)
+        del self.keys_by_id[entry_id]
+        self.semantic_index.remove_ids(np.array([entry_id], dtype="int64"))
+
+    def _clear(self):
+        self.entries.clear()
+        self.keys_by_id.clear()
+        self.semantic_index.reset()
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.array([embedding], dtype="float32")
+        faiss.normalize_L2(vector)
+        return vector
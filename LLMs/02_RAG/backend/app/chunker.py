@@ -1,16 +1,74 @@
+import io
+import re
+from dataclasses import dataclass
 
-def chunk_text(text, chunk_size=500, overlap=50):
-    # Split text into words
-    words = text.split()
+WORD_PATTERN = re.compile(r"\S+")
+SENTENCE_END = (".", "!", "?")
+
+
+@dataclass
+class Chunk:
+    text: str
+    start: int  # character offset of the first word in the source
+    end: int    # character offset just past the last word
+
+
+def iter_words(f, read_size=1 << 16):
+    # Yield (word, start, end) from a file handle, reading one block at a time
+    offset = 0
+    carry = ""
+    while True:
+        block = f.read(read_size)
+        text = carry + block
+        base = offset - len(carry)
+        last_end = 0
+        for match in WORD_PATTERN.finditer(text):
+            # A word touching the end of the block may continue in the next one
+            if block and match.end() == len(text):
+                break
+            yield match.group(), base + match.start(), base + match.end()
+            last_end = match.end()
+        if not block:
+            return
+        carry = text[last_end:].lstrip()
+        offset += len(block)
+
+
+def _cut_point(window, snap_to_sentence):
+    # Number of words to emit from a full window; snapping never shrinks a chunk below half
+    if snap_to_sentence:
+        for i in range(len(window) - 1, len(window) // 2 - 2, -1):
+            if window[i][0].endswith(SENTENCE_END):
+                return i + 1
+    return len(window)
 
-    chunks = []
-    start = 0
 
-    while start < len(words):
-        # Create chunk with overlap
-        end = start + chunk_size
-        chunk = " ".join(words[start:end])
-        chunks.append(chunk)
-        start = end - overlap # move back by overlap
+def _make_chunk(words):
+    return Chunk(text=" ".join(w for w, _, _ in words), start=words[0][1], end=words[-1][2])
 
-    return chunks
\ No newline at end of file
+
+def iter_chunks(f, chunk_size=500, overlap=50, snap_to_sentence=False, read_size=1 << 16):
+    if not 0 <= overlap < chunk_size:
+        raise ValueError("overlap must be between 0 and chunk_size - 1")
+
+    # Only a sliding window of at most chunk_size words is held in memory
+    window = []
+    emitted = 0  # words of the current window already part of a yielded chunk
+    for word in iter_words(f, read_size):
+        window.append(word)
+        if len(window) < chunk_size:
+            continue
+        cut = _cut_point(window, snap_to_sentence)
+        yield _make_chunk(window[:cut])
+        # Move forward, keeping `overlap` words of context
+        drop = max(cut - overlap, 1)
+        del window[:drop]
+        emitted = cut - drop
+
+    # Tail only if it has words not already yielded
+    if len(window) > emitted:
+        yield _make_chunk(window)
+
+
+def chunk_text(text, chunk_size=500, overlap=50):
+    return [chunk.text for chunk in iter_chunks(io.StringIO(text), chunk_size, overlap)]
@@ -0,0 +1,168 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from .index_cache import QUERY_OPTIONS, build_lock
+from .sharded_store import create_store, load_store
+from .storage import file_stamp
+from .vector_store import STORE_FILE, VectorStore
+
+NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+
+class CollectionManager:
+    # Named vector stores, each persisted in its own directory, loaded on first use and evicted
+    # least recently used first once their estimated memory exceeds the budget.
+    #
+    # Every worker process holds its own copies. Writes go through update(), which holds the
+    # collection's file lock and starts from the latest saved store, and every get() reloads a
+    # store that another worker has saved since, so all workers serve and extend the same data.
+    def __init__(self, root_dir: str, memory_budget_bytes: int, index_options: dict = None,
+                 mmap: bool = False, on_evict=None):
+        self.root_dir = root_dir
+        self.memory_budget_bytes = memory_budget_bytes
+        self.index_options = index_options or {}
+        self.query_options = {key: value for key, value in self.index_options.items() if key in QUERY_OPTIONS}
+        self.mmap = mmap
+        self.on_evict = on_evict
+        self.lock = threading.Lock()
+        self.loaded = OrderedDict()  # name -> VectorStore, least recently used first
+        self.paths = {}              # collections persisted outside root_dir
+        self.loads = 0
+        self.reloads = 0
+        self.evictions = 0
+
+    def path(self, name: str) -> str:
+        if name in self.paths:
+            return self.paths[name]
+        if not NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid collection name {name!r}")
+        return os.path.join(self.root_dir, name)
+
+    def register(self, name: str, vector_store: VectorStore, path: str):
+        # Adopt a store that was built elsewhere, such as the startup knowledge base
+        with self.lock:
+            self.paths[name] = path
+            self.loaded[name] = vector_store
+            self._evict(keep=name)
+
+    def exists(self, name: str) -> bool:
+        return name in self.loaded or os.path.exists(os.path.join(self.path(name), STORE_FILE))
+
+    def names(self) -> list[str]:
+        on_disk = set()
+        if os.path.isdir(self.root_dir):
+            on_disk = {name for name in os.listdir(self.root_dir)
+                       if os.path.exists(os.path.join(self.root_dir, name, STORE_FILE))}
+        return sorted(on_disk | set(self.paths) | set(self.loaded))
+
+    def get(self, name: str, create: bool = False, locked: bool = False) -> VectorStore:
+        # Raises KeyError for a collection that does not exist. With create, a missing collection is
+        # a new empty store, served only once update() has saved it. `locked`: the caller holds the
+        # collection's file lock.
+        path = self.path(name)
+        store_path = os.path.join(path, STORE_FILE)
+        with self.lock:
+            vector_store = self.loaded.get(name)
+            if vector_store is not None:
+                self.loaded.move_to_end(name)
+                if vector_store.stamp == file_stamp(store_path):
+                    return vector_store
+
+        # Not loaded, or another worker has saved it since. Files are read outside self.lock, so
+        # other collections are served meanwhile.
+        if vector_store is None and not os.path.exists(store_path):
+            if create:
+                return create_store(**self.index_options)
+            raise KeyError(name)
+        if locked:
+            fresh = self._load(path)
+        else:
+            try:
+                # Shared, so a store is not read halfway through another worker's save
+                with build_lock(path, shared=True, blocking=False):
+                    fresh = self._load(path)
+            except BlockingIOError:
+                # Another worker is writing, which can take long (a corpus ingestion, say). Keep
+                # serving the copy we have; a cold collection is read anyway, and if a save was
+                # under way its stamp will not match, so the next get() reads it again.
+                if vector_store is not None:
+                    return vector_store
+                fresh = self._load(path)
+            except PermissionError:
+                fresh = self._load(path)  # a read-only index directory has no writers to wait for
+
+        with self.lock:
+            if vector_store is not None:
+                self.reloads += 1
+                if self.on_evict is not None:
+                    self.on_evict(name)
+            else:
+                self.loads += 1
+            self.loaded[name] = fresh
+            self._evict(keep=name)
+        return fresh
+
+    def _load(self, path: str):
+        return load_store(path, mmap=self.mmap, **self.query_options)
+
+    def update(self, name: str, change, create: bool = False):
+        # Run change(vector_store) on the latest saved store and save the result, holding the
+        # collection's file lock so writes from all workers apply one after another. A collection
+        # created here is only served once it has been saved.
+        if not create and not self.exists(name):
+            raise KeyError(name)
+        path = self.path(name)
+        with build_lock(path):
+            vector_store = self.get(name, create=create, locked=True)
+            version = vector_store.version
+            try:
+                result = change(vector_store)
+                if vector_store.version != version:
+                    vector_store.save(path)
+            except BaseException:
+                if vector_store.version != version:
+                    # Half changed: it no longer matches its files, so the next get() reloads them
+                    vector_store.stamp = None
+                raise
+            if vector_store.version != version:
+                with self.lock:
+                    self.loaded[name] = vector_store
+                    self.loaded.move_to_end(name)
+                    self._evict(keep=name)
+        return result
+
+    def save(self, name: str):
+        with self.lock:
+            vector_store = self.loaded.get(name)
+        if vector_store is not None:
+            vector_store.save(self.path(name))
+
+    def memory_bytes(self) -> int:
+        with self.lock:
+            return sum(vector_store.memory_bytes() for vector_store in self.loaded.values())
+
+    def _evict(self, keep: str):
+        # Stores are saved on every change, so an evicted collection reloads exactly as it was
+        total = sum(vector_store.memory_bytes() for vector_store in self.loaded.values())
+        for name in list(self.loaded):
+            if total <= self.memory_budget_bytes:
+                break
+            if name == keep or not os.path.exists(os.path.join(self.path(name), STORE_FILE)):
+                # Never drop the store being served, or one that has not been saved yet
+                continue
+            vector_store = self.loaded.pop(name)
+            total -= vector_store.memory_bytes()
+            self.evictions += 1
+            if self.on_evict is not None:
+                self.on_evict(name)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "loaded": {name: vector_store.memory_bytes() for name, vector_store in self.loaded.items()},
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "loads": self.loads,
+                "reloads": self.reloads,
+                "evictions": self.evictions,
+            }
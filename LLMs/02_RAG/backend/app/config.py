@@ -10,6 +10,76 @@ class Settings:
     JWT_SECRET = os.environ.get("JWT_SECRET", "")
     JWT_ISSUER = os.environ.get("JWT_ISSUER", "")
 
+    EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "text-embedding-3-small")
+    # Ask the embedding API for shortened vectors (text-embedding-3 models only; 0 = full width)
+    EMBEDDING_DIMENSIONS = int(os.environ.get("EMBEDDING_DIMENSIONS", "0"))
+    EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "512"))
+    EMBED_BATCH_TOKENS = int(os.environ.get("EMBED_BATCH_TOKENS", "250000"))
+    EMBED_MAX_IN_FLIGHT = int(os.environ.get("EMBED_MAX_IN_FLIGHT", "4"))
+    CHUNK_SIZE = int(os.environ.get("CHUNK_SIZE", "500"))
+    CHUNK_OVERLAP = int(os.environ.get("CHUNK_OVERLAP", "50"))
+    # Chunks repeating an earlier chunk of the same document are not stored: 1 = same text only, below 1 =
+    # also near-duplicates down to this estimated word 3-gram Jaccard similarity, 0 = keep everything
+    DEDUP_THRESHOLD = float(os.environ.get("DEDUP_THRESHOLD", "0.9"))
+
+    # flat (exact), ivf_flat, hnsw, ivf_pq, sq8 (int8 codes) or pq; nprobe/ef_search trade recall for query latency
+    INDEX_TYPE = os.environ.get("INDEX_TYPE", "flat")
+    INDEX_NLIST = int(os.environ.get("INDEX_NLIST", "1024"))
+    INDEX_HNSW_M = int(os.environ.get("INDEX_HNSW_M", "32"))
+    INDEX_PQ_M = int(os.environ.get("INDEX_PQ_M", "16"))
+    INDEX_NPROBE = int(os.environ.get("INDEX_NPROBE", "16"))
+    INDEX_EF_SEARCH = int(os.environ.get("INDEX_EF_SEARCH", "64"))
+    # Project vectors onto this many principal components inside the index, fitted on the first
+    # vectors added and saved with the index (0 = off); see benchmarks/bench_dimensions.py
+    INDEX_PCA_DIM = int(os.environ.get("INDEX_PCA_DIM", "0"))
+    # For ivf_pq, sq8, pq and PCA: re-score INDEX_RERANK * k candidates against the exact stored vectors (0 = off)
+    INDEX_RERANK = int(os.environ.get("INDEX_RERANK", "4"))
+    # Split the index into this many shards by document, searched in parallel (1 = a single index)
+    INDEX_SHARDS = int(os.environ.get("INDEX_SHARDS", "1"))
+
+    # Chunks retrieved per question, before relevance trimming
+    SEARCH_K = int(os.environ.get("SEARCH_K", "3"))
+    # Search this many times SEARCH_K chunks, so that near-identical chunks of different documents
+    # (shared boilerplate, copies of a document) can be collapsed and still leave SEARCH_K (1 = off)
+    SEARCH_FETCH_FACTOR = int(os.environ.get("SEARCH_FETCH_FACTOR", "2"))
+    # Questions whose best chunk is farther than this (squared L2 distance) get "I don't know"
+    # without an LLM call (0 = off); fit it with benchmarks/calibrate_relevance.py
+    RELEVANCE_MAX_DISTANCE = float(os.environ.get("RELEVANCE_MAX_DISTANCE", "0"))
+    # Drop the chunks after the first jump in distance larger than this (0 = keep all SEARCH_K)
+    RELEVANCE_DROP_OFF = float(os.environ.get("RELEVANCE_DROP_OFF", "0"))
+
+    # Retrieved chunks are merged, de-duplicated and cut to this many prompt tokens (0 = unlimited)
+    CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "3000"))
+    # Passages sharing at least this fraction of word 3-grams with a better-ranked one are dropped
+    CONTEXT_DEDUP_THRESHOLD = float(os.environ.get("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+
+    # Upper bound on concurrent chat completion calls across all requests of a worker
+    LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "8"))
+
+    # Answer cache: exact question match, then cosine similarity of question embeddings
+    ANSWER_CACHE_SIZE = int(os.environ.get("ANSWER_CACHE_SIZE", "1000"))
+    ANSWER_CACHE_TTL = float(os.environ.get("ANSWER_CACHE_TTL", "3600"))
+    ANSWER_CACHE_THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", "0.95"))
+
+    # Serve the index, texts and vectors from read-only memory maps shared by all workers.
+    # Runtime document ingestion is disabled in this mode.
+    INDEX_MMAP = os.environ.get("INDEX_MMAP", "false").lower() in ("1", "true", "yes")
+    # Precision of the stored full vectors: float32 or float16
+    VECTOR_DTYPE = os.environ.get("VECTOR_DTYPE", "float32")
+
+    # Directory where the FAISS index, chunk texts and manifest are persisted
+    INDEX_DIR = os.environ.get("INDEX_DIR", os.path.join(abs_path, '..', 'index'))
+
+    # Named collections, one persisted index per directory; the knowledge base above is "default".
+    # Least recently used collections are unloaded once their estimated memory exceeds the budget.
+    COLLECTIONS_DIR = os.environ.get("COLLECTIONS_DIR", os.path.join(abs_path, '..', 'collections'))
+    COLLECTIONS_MEMORY_BUDGET_MB = int(os.environ.get("COLLECTIONS_MEMORY_BUDGET_MB", "2048"))
+    DEFAULT_COLLECTION = os.environ.get("DEFAULT_COLLECTION", "default")
+
+    # Loading the knowledge base is retried with backoff this many times before the worker reports
+    # itself dead on the liveness probe (/) and is restarted
+    WARMUP_ATTEMPTS = int(os.environ.get("WARMUP_ATTEMPTS", "5"))
+
 
 settings = Settings()
 print("Configuration loaded successfully.")
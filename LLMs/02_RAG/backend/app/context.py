@@ -0,0 +1,138 @@
+from .embeddings.batching import estimate_tokens
+
+SEPARATOR = "\n"
+
+
+def _stitch(words, more, overlap_chars: int):
+    # Append `more` to `words`, skipping its leading words that lie in the `overlap_chars` characters
+    # of source both chunks cover. Words alone are ambiguous in repetitive text (a table row, a
+    # refrain), so the skipped prefix must also fit in the overlapping span; none does across a gap.
+    skip, length = 0, -1
+    for n, word in enumerate(more[:len(words)], start=1):
+        length += len(word) + 1
+        if length > overlap_chars:
+            break
+        if words[-n:] == more[:n]:
+            skip = n
+    return words + more[skip:]
+
+
+def merge_hits(hits, max_gap: int = 2):
+    # Merge retrieved chunks of the same document whose source spans overlap or touch.
+    # Returns (rank, text) passages; a passage ranks as its best chunk.
+    passages = []
+    by_doc = {}
+    for rank, hit in enumerate(hits):
+        if hit.doc_id is None or hit.start is None or hit.end is None:
+            passages.append((rank, hit.text))
+        else:
+            by_doc.setdefault(hit.doc_id, []).append((hit.start, hit.end, rank, hit.text))
+
+    for spans in by_doc.values():
+        spans.sort()
+        start, end, rank, words = spans[0][0], spans[0][1], spans[0][2], spans[0][3].split()
+        for next_start, next_end, next_rank, text in spans[1:]:
+            if next_start > end + max_gap:
+                passages.append((rank, " ".join(words)))
+                start, end, rank, words = next_start, next_end, next_rank, text.split()
+                continue
+            if next_end > end:
+                words = _stitch(words, text.split(), end - next_start)
+                end = next_end
+            rank = min(rank, next_rank)
+        passages.append((rank, " ".join(words)))
+
+    passages.sort(key=lambda passage: passage[0])
+    return passages
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = text.lower().split()
+    if len(words) <= size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def drop_near_duplicates(texts, threshold: float = 0.8):
+    # Keep a passage only if its word shingles are not mostly shared with a better-ranked one
+    kept, kept_shingles = [], []
+    for text in texts:
+        shingles = _shingles(text)
+        if any(len(shingles & other) / len(shingles | other) >= threshold for other in kept_shingles):
+            continue
+        kept.append(text)
+        kept_shingles.append(shingles)
+    return kept
+
+
+def fit_budget(texts, token_budget: int, min_tokens: int = 32):
+    # Take passages in rank order until the budget is spent; the last one may be cut at a word boundary
+    if not token_budget:
+        return list(texts)
+    packed, used = [], 0
+    for text in texts:
+        tokens = estimate_tokens(text + SEPARATOR)
+        if used + tokens <= token_budget:
+            packed.append(text)
+            used += tokens
+            continue
+        remaining = token_budget - used
+        if remaining >= min_tokens:
+            cut = text[:remaining * 4 - len(SEPARATOR) - 4]
+            packed.append(cut.rsplit(" ", 1)[0])
+        break
+    return packed
+
+
+def pack_context(hits, token_budget: int = None, dedup_threshold: float = 0.8):
+    # Turn ranked search hits into prompt passages: merge overlapping chunks, drop near-duplicates,
+    # then fit the token budget. Returns the passages and how many prompt tokens that saved.
+    passages = [text for _, text in merge_hits(hits)]
+    passages = drop_near_duplicates(passages, dedup_threshold)
+    passages = fit_budget(passages, token_budget)
+
+    tokens_before = estimate_tokens(SEPARATOR.join(hit.text for hit in hits))
+    tokens_after = estimate_tokens(SEPARATOR.join(passages))
+    return passages, {
+        "chunks": len(hits),
+        "passages": len(passages),
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after,
+        "tokens_saved": tokens_before - tokens_after,
+    }
+
+
+def distinct_hits(hits, k: int, threshold: float = 0.8):
+    # The best k hits, skipping any whose text repeats (or shares at least `threshold` of its word
+    # 3-grams with) a better hit of another document. Shared boilerplate and copies of a document
+    # would otherwise take several of the k slots with one passage. Chunks of the same document
+    # are kept for merge_hits to stitch.
+    kept, kept_shingles = [], []
+    for hit in hits:
+        shingles = _shingles(hit.text)
+        if any((hit.doc_id is None or other.doc_id != hit.doc_id)
+               and len(shingles & other_shingles) / len(shingles | other_shingles) >= threshold
+               for other, other_shingles in zip(kept, kept_shingles)):
+            continue
+        kept.append(hit)
+        kept_shingles.append(shingles)
+        if len(kept) == k:
+            break
+    return kept
+
+
+def select_relevant(hits, max_distance: float = 0.0, drop_off: float = 0.0):
+    # Keep the hits worth sending to the LLM, given in order of increasing distance.
+    # max_distance: farther hits are off topic (0 = no limit), so an unrelated question keeps none.
+    # drop_off: cut at the first gap in distance larger than this (0 = off), so k shrinks when
+    # only the top few chunks are close.
+    kept = []
+    for hit in hits:
+        if hit.distance is None:
+            return list(hits)
+        if max_distance and hit.distance > max_distance:
+            break
+        if drop_off and kept and hit.distance - kept[-1].distance > drop_off:
+            break
+        kept.append(hit)
+    return kept
@@ -0,0 +1,165 @@
+"""Ingest a corpus of text files into the persisted index.
+
+Run from LLMs/02_RAG/backend:  python -m app.corpus "corpus/**/*.txt" --root corpus
+
+Files are hashed and chunked in a process pool, and several files are embedded at once. Progress is
+checkpointed into the index manifest, so an interrupted run resumes where the last checkpoint left
+off and a re-run only ingests files that changed.
+
+Document ids are "corpus:" plus the path relative to --root, and the manifest records the root each
+one came from, so the index can hold several corpora next to the server's own knowledge file.
+"""
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from .chunker import iter_chunks
+from .index_cache import build_lock, hash_file, index_config, open_for_update, write_manifest
+from .ingest import ingest_document
+
+DOC_ID_PREFIX = "corpus:"
+
+
+def expand_paths(patterns, extensions=(".txt", ".md")) -> list[str]:
+    # Glob patterns (with ** for any depth), files, and directories searched recursively
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for directory, _, names in os.walk(pattern):
+                paths.update(os.path.join(directory, name) for name in names if name.endswith(extensions))
+        else:
+            paths.update(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+    return sorted(os.path.abspath(path) for path in paths)
+
+
+def document_id(path: str, root: str) -> str:
+    # Prefixed, so a corpus file never takes the id of the server's knowledge file (its basename)
+    return DOC_ID_PREFIX + os.path.relpath(path, root).replace(os.sep, "/")
+
+
+def chunk_file(path: str, chunk_size: int, overlap: int):
+    # Runs in a worker process; the file is streamed, never read whole
+    with open(path, errors="replace") as f:
+        return list(iter_chunks(f, chunk_size, overlap))
+
+
+def ingest_corpus(paths, embedder, index_dir: str, root: str = None, chunk_size: int = 500, overlap: int = 50,
+                  batch_size: int = 4096, index_options: dict = None, processes: int = None,
+                  embed_workers: int = 4, checkpoint_every: int = 500, delete_missing: bool = False,
+                  dedup_threshold: float = 0.0, progress=None) -> dict:
+    # progress(**fields), if given, is told the phase and running totals after every file
+    index_options = index_options or {}
+    report = progress or (lambda **fields: None)
+    root = os.path.abspath(root or (os.path.commonpath([os.path.dirname(path) for path in paths]) if paths else "."))
+    doc_ids = [document_id(path, root) for path in paths]
+    config = index_config(embedder, index_options)
+    totals = {"files": len(paths), "unchanged": 0, "ingested": 0, "chunks": 0, "embedded": 0, "duplicates": 0,
+              "deleted": 0}
+
+    report(phase="waiting_for_build_lock")
+    with build_lock(index_dir), ProcessPoolExecutor(processes) as chunk_pool, \
+            ThreadPoolExecutor(embed_workers, thread_name_prefix="ingest") as embed_pool:
+        vector_store, documents, reuse = open_for_update(index_dir, embedder, index_options)
+        taken = sorted(doc_id for doc_id in doc_ids if documents.get(doc_id, {}).get("corpus_root", root) != root)
+        if taken:
+            # Same relative path under another root: ingesting would overwrite that corpus's document
+            raise ValueError(f"{len(taken)} files, such as {taken[0]!r}, are indexed from another root; "
+                             "pass a different --root or --index-dir")
+
+        def checkpoint():
+            # The store is saved before the manifest names its documents, so after a crash the
+            # manifest never lists a document the saved store does not hold
+            if vector_store.dim is None:
+                return  # nothing has been embedded yet
+            vector_store.save(index_dir)
+            write_manifest(index_dir, {"config": config, "documents": documents})
+
+        report(phase="hashing", **totals)
+        hashes = list(chunk_pool.map(hash_file, paths, chunksize=64))
+        sources = [{"source_hash": digest, "chunk_size": chunk_size, "overlap": overlap,
+                    "document_dedup": dedup_threshold, "corpus_root": root} for digest in hashes]
+        todo = [i for i, (doc_id, source) in enumerate(zip(doc_ids, sources)) if documents.get(doc_id) != source]
+        totals["unchanged"] = len(paths) - len(todo)
+
+        if delete_missing:
+            # Only documents ingested from this root; other corpora and the server's file stay
+            from_root = {doc_id for doc_id, source in documents.items() if source.get("corpus_root") == root}
+            for doc_id in from_root - set(doc_ids):
+                vector_store.delete_document(doc_id)
+                del documents[doc_id]
+                totals["deleted"] += 1
+
+        def ingest(i, chunk_future):
+            chunks = chunk_future.result()
+            return i, ingest_document(vector_store, doc_ids[i], chunks, embedder.embed,
+                                      batch_size=batch_size, reuse=reuse, dedup_threshold=dedup_threshold)
+
+        def submit_chunking(wave):
+            return [(i, chunk_pool.submit(chunk_file, paths[i], chunk_size, overlap)) for i in wave]
+
+        # Files go in waves of checkpoint_every; the next wave is chunked while this one is embedded,
+        # and at most two waves of chunks are held in memory
+        waves = [todo[start:start + checkpoint_every] for start in range(0, len(todo), checkpoint_every)]
+        report(phase="ingesting", **totals)
+        chunking = submit_chunking(waves[0]) if waves else []
+        for n in range(len(waves)):
+            current = chunking
+            chunking = submit_chunking(waves[n + 1]) if n + 1 < len(waves) else []
+            for future in [embed_pool.submit(ingest, i, chunk_future) for i, chunk_future in current]:
+                i, result = future.result()
+                documents[doc_ids[i]] = sources[i]
+                totals["ingested"] += 1
+                totals["chunks"] += result["chunks"]
+                totals["embedded"] += result["embedded"]
+                totals["duplicates"] += result["duplicates"]
+                report(**totals)
+            report(phase="checkpoint", **totals)
+            checkpoint()
+            report(phase="ingesting", **totals)
+
+        if totals["deleted"] and not waves:
+            checkpoint()
+    report(phase="done", **totals)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("patterns", nargs="+", help="files, directories or glob patterns (quote ** patterns)")
+    parser.add_argument("--root", help="document ids are paths relative to this (default: common directory)")
+    parser.add_argument("--index-dir", help="default: INDEX_DIR")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="chunking processes")
+    parser.add_argument("--embed-workers", type=int, default=4, help="files embedded at once")
+    parser.add_argument("--checkpoint-every", type=int, default=500, help="files between checkpoints")
+    parser.add_argument("--delete-missing", action="store_true",
+                        help="remove documents ingested from the same root that are not among the given files")
+    args = parser.parse_args()
+
+    # The same embedder and index settings as the server, so it can serve the result
+    from .config import Settings
+    from .main import embedder, index_options
+
+    paths = expand_paths(args.patterns)
+    started = time.perf_counter()
+    last = [0.0]
+
+    def progress(**fields):
+        if fields.get("phase") or time.perf_counter() - last[0] > 1:
+            last[0] = time.perf_counter()
+            print(f"[{last[0] - started:7.1f}s] " + " ".join(f"{key}={value}" for key, value in fields.items()))
+
+    try:
+        totals = ingest_corpus(
+            paths, embedder, args.index_dir or Settings.INDEX_DIR, root=args.root,
+            chunk_size=Settings.CHUNK_SIZE, overlap=Settings.CHUNK_OVERLAP, index_options=index_options,
+            processes=args.processes, embed_workers=args.embed_workers, checkpoint_every=args.checkpoint_every,
+            delete_missing=args.delete_missing, dedup_threshold=Settings.DEDUP_THRESHOLD, progress=progress,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    print(totals)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import hashlib
+import zlib
+import numpy as np
+from .context import _shingles
+
+
+class MinHasher:
+    # MinHash signatures of word 3-gram sets. Each permutation is a multiply-shift hash of the
+    # shingle's crc32, so a signature is one vectorized min over the shingles.
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 2**63, num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 2**63, num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        keys = np.array([zlib.crc32(" ".join(shingle).encode("utf-8")) for shingle in _shingles(text)],
+                        dtype=np.uint64)
+        # uint64 arithmetic wraps, which is what multiply-shift hashing wants
+        hashes = (self.a[:, None] * keys[None, :] + self.b[:, None]) >> np.uint64(32)
+        return hashes.min(axis=1).astype(np.uint32)
+
+
+class ChunkDeduplicator:
+    # Finds earlier chunks of the same document with the same text (after collapsing case and
+    # whitespace) or, for threshold < 1, an estimated word 3-gram Jaccard similarity of at least
+    # threshold. Signatures are split into LSH bands, so a lookup only compares the few chunks that
+    # share a band instead of every earlier chunk.
+    #
+    # One is used per ingestion of a document. Collapsing chunks across documents would leave a
+    # document without the text that its metadata filters and deletes act on.
+    def __init__(self, threshold: float = 0.9, num_perm: int = 64, bands: int = 16):
+        self.threshold = threshold
+        self.rows = num_perm // bands
+        self.bands = bands
+        self.hasher = MinHasher(num_perm)
+        self.exact = {}        # text digest -> chunk id
+        self.buckets = {}      # (band, band signature) -> chunk ids
+        self.signatures = {}   # chunk id -> signature
+
+    @staticmethod
+    def _digest(text: str) -> bytes:
+        return hashlib.sha1(" ".join(text.lower().split()).encode("utf-8")).digest()
+
+    def _band_keys(self, signature):
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+    def check(self, chunk_id: int, text: str):
+        # Returns the id of an earlier duplicate of `text`, or None after recording `text` as new
+        digest = self._digest(text)
+        if digest in self.exact:
+            return self.exact[digest]
+        signature = None
+        if self.threshold < 1:
+            signature = self.hasher.signature(text)
+            candidates = {other for key in self._band_keys(signature) for other in self.buckets.get(key, ())}
+            for other in candidates:
+                if np.mean(self.signatures[other] == signature) >= self.threshold:
+                    return other
+        self.exact[digest] = chunk_id
+        if signature is not None:
+            self.signatures[chunk_id] = signature
+            for key in self._band_keys(signature):
+                self.buckets.setdefault(key, []).append(chunk_id)
+        return None
@@ -1,4 +1,14 @@
+import asyncio
 
 class EmbeddingBackend():
+    # Used to key persisted embeddings, so cached vectors are never mixed across models
+    model_name = "unknown"
+    # Exceptions worth retrying (rate limits, timeouts, server errors)
+    transient_errors = ()
+
     def embed(self, texts: list[str]):
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+    async def aembed(self, texts: list[str]):
+        # Backends without a native async client run in a worker thread
+        return await asyncio.to_thread(self.embed, texts)
@@ -0,0 +1,159 @@
+import asyncio
+import collections
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .base import EmbeddingBackend
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly 4 characters per token for English text
+    return len(text) // 4 + 1
+
+
+class InFlightLimit:
+    # At most `limit` holders at once, counted across threads and coroutines alike, so blocking
+    # ingestion and async queries share one budget. A released slot passes straight to the
+    # longest waiter, whichever kind it is.
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self.lock = threading.Lock()
+        self.waiters = collections.deque()  # callables that hand a slot to a waiter
+
+    def _take(self, waiter) -> bool:
+        # Called with the lock held: take a free slot, or queue `waiter` to be handed one
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            return True
+        self.waiters.append(waiter)
+        return False
+
+    def release(self):
+        with self.lock:
+            if not self.waiters:
+                self.active -= 1
+                return
+            wake = self.waiters.popleft()
+        wake()
+
+    def __enter__(self):
+        event = threading.Event()
+        with self.lock:
+            taken = self._take(event.set)
+        if not taken:
+            event.wait()
+
+    def __exit__(self, *exc):
+        self.release()
+
+    async def __aenter__(self):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def hand_over():
+            if future.done():
+                self.release()  # the waiter was cancelled; pass the slot on
+            else:
+                future.set_result(None)
+
+        def wake():
+            try:
+                loop.call_soon_threadsafe(hand_over)
+            except RuntimeError:
+                self.release()  # the waiter's event loop is closed
+
+        with self.lock:
+            taken = self._take(wake)
+        if not taken:
+            try:
+                await future
+            except asyncio.CancelledError:
+                # Cancelled after the slot was handed over but before this task resumed
+                if future.done() and not future.cancelled():
+                    self.release()
+                raise
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+
+class BatchingEmbeddingBackend(EmbeddingBackend):
+    def __init__(self, backend: EmbeddingBackend, max_batch_size: int = 512,
+                 max_batch_tokens: int = 250_000, max_in_flight: int = 4,
+                 max_retries: int = 5, backoff: float = 0.5, max_backoff: float = 30.0):
+        self.backend = backend
+        self.model_name = backend.model_name
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_in_flight = max_in_flight
+        # Shared by every embed() and aembed() call on this backend, so max_in_flight caps the load
+        # on the provider however many requests or ingestion workers are embedding at once
+        self.in_flight = InFlightLimit(max_in_flight)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def make_batches(self, texts: list[str]) -> list[list[int]]:
+        # Group input positions so each batch stays under both the count and token limits
+        batches = []
+        batch, batch_tokens = [], 0
+        for i, text in enumerate(texts):
+            tokens = estimate_tokens(text)
+            if batch and (len(batch) == self.max_batch_size or batch_tokens + tokens > self.max_batch_tokens):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(i)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _embed_with_retry(self, texts: list[str]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.in_flight:
+                    return self.backend.embed(texts)
+            except self.backend.transient_errors:
+                if attempt == self.max_retries:
+                    raise
+                # Exponential backoff with jitter
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+                time.sleep(delay * random.uniform(0.5, 1.0))
+
+    async def _aembed_with_retry(self, texts: list[str]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.in_flight:
+                    return await self.backend.aembed(texts)
+            except self.backend.transient_errors:
+                if attempt == self.max_retries:
+                    raise
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+    def embed(self, texts: list[str]):
+        batches = self.make_batches(texts)
+        if len(batches) <= 1:
+            return self._embed_with_retry(texts) if texts else []
+
+        results = [None] * len(texts)
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            batch_results = pool.map(self._embed_with_retry, [[texts[i] for i in batch] for batch in batches])
+            # Put every vector back at the position of its input text
+            for batch, vectors in zip(batches, batch_results):
+                for i, vector in zip(batch, vectors):
+                    results[i] = vector
+        return results
+
+    async def aembed(self, texts: list[str]):
+        batches = self.make_batches(texts)
+        batch_results = await asyncio.gather(
+            *(self._aembed_with_retry([texts[i] for i in batch]) for batch in batches)
+        )
+        results = [None] * len(texts)
+        for batch, vectors in zip(batches, batch_results):
+            for i, vector in zip(batch, vectors):
+                results[i] = vector
+        return results
@@ -0,0 +1,21 @@
+from ..single_flight import SingleFlight
+from .base import EmbeddingBackend
+
+
+class CoalescingEmbeddingBackend(EmbeddingBackend):
+    # Concurrent async requests for the same texts share one embedding call. The blocking embed()
+    # used by ingestion is passed straight through.
+    def __init__(self, backend: EmbeddingBackend):
+        self.backend = backend
+        self.transient_errors = backend.transient_errors
+        self.flight = SingleFlight("embed")
+
+    @property
+    def model_name(self):
+        return self.backend.model_name
+
+    def embed(self, texts: list[str]):
+        return self.backend.embed(texts)
+
+    async def aembed(self, texts: list[str]):
+        return await self.flight.do(tuple(texts), lambda: self.backend.aembed(texts))
@@ -0,0 +1,56 @@
+import asyncio
+import hashlib
+import random
+import threading
+import time
+import numpy as np
+from .base import EmbeddingBackend
+
+
+class FakeTransientError(Exception):
+    pass
+
+
+class FakeEmbeddingBackend(EmbeddingBackend):
+    # Deterministic local stand-in for a remote embedding API, for tests and benchmarks
+    transient_errors = (FakeTransientError,)
+
+    def __init__(self, dim: int = 64, latency: float = 0.0, failure_rate: float = 0.0, seed: int = 0):
+        self.model_name = f"fake-{dim}"
+        self.dim = dim
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.texts_embedded = 0
+
+    def embed_one(self, text: str):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dim).astype("float32")
+        return vector / np.linalg.norm(vector)
+
+    def _start_call(self) -> bool:
+        # Count the call and decide whether it should fail
+        with self.lock:
+            self.calls += 1
+            return self.random.random() < self.failure_rate
+
+    def _finish_call(self, texts: list[str], fail: bool):
+        if fail:
+            raise FakeTransientError("simulated transient embedding failure")
+        with self.lock:
+            self.texts_embedded += len(texts)
+        return [self.embed_one(text).tolist() for text in texts]
+
+    def embed(self, texts: list[str]):
+        fail = self._start_call()
+        if self.latency:
+            time.sleep(self.latency)
+        return self._finish_call(texts, fail)
+
+    async def aembed(self, texts: list[str]):
+        fail = self._start_call()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._finish_call(texts, fail)
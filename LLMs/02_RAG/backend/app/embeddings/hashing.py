@@ -0,0 +1,146 @@
+import hashlib
+import re
+import threading
+import zlib
+from itertools import chain
+import numpy as np
+from .base import EmbeddingBackend
+
+TOKEN_PATTERN = re.compile(r"\w+")
+SIGN_BIT = 1 << 31
+
+
+def _hash(key: str) -> int:
+    # Stable across processes, unlike hash(); vectors are persisted in the index
+    return zlib.crc32(key.encode("utf-8"))
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    # Local, model-free embeddings: signed feature hashing of words, word bigrams and character
+    # n-grams into `dim` buckets, optionally TF-IDF weighted, L2-normalised. No network, no weights
+    # to load; good for tests, air-gapped deployments and as a cheap first-pass retriever.
+    def __init__(self, dim: int = 1024, word_bigrams: bool = True, char_ngrams: tuple = (3, 5),
+                 char_weight: float = 1.0, bigram_weight: float = 0.5, idf=None,
+                 max_vocabulary: int = 1_000_000):
+        self.dim = dim
+        self.word_bigrams = word_bigrams
+        self.char_ngrams = char_ngrams
+        self.char_weight = char_weight
+        self.bigram_weight = bigram_weight
+        self.max_vocabulary = max_vocabulary
+        self.idf = None if idf is None else np.asarray(idf, dtype="float32")
+        # The vocabulary is shared mutable state; batches from worker threads take turns
+        self.lock = threading.RLock()
+        self._reset_vocabulary()
+
+    @property
+    def model_name(self) -> str:
+        # Every setting changes the vectors, so all of them key the persisted index
+        lo, hi = self.char_ngrams or (0, 0)
+        name = f"hashing-{self.dim}-b{int(self.word_bigrams)}{self.bigram_weight:g}-c{lo}{hi}{self.char_weight:g}"
+        if self.idf is not None:
+            name += "-idf" + hashlib.sha256(self.idf.tobytes()).hexdigest()[:12]
+        return name
+
+    def _reset_vocabulary(self):
+        # Each distinct word is hashed once; its features live in flat arrays indexed by word id
+        self.vocabulary = {}
+        self._pending = []
+        self._word_hashes = np.zeros(0, dtype="int64")
+        self._offsets = np.zeros(1, dtype="int64")
+        self._buckets = np.zeros(0, dtype="int64")
+        self._weights = np.zeros(0, dtype="float32")
+
+    def _word_features(self, word: str):
+        keys, weights = [word], [1.0]
+        if self.char_ngrams and self.char_weight:
+            padded = f"<{word}>"
+            lo, hi = self.char_ngrams
+            grams = [padded[i:i + n] for n in range(lo, hi + 1) for i in range(len(padded) - n + 1)]
+            if grams:
+                # The n-grams of a word together weigh char_weight, however long the word is
+                keys += ["#" + gram for gram in grams]
+                weights += [self.char_weight / len(grams)] * len(grams)
+        hashes = np.array([_hash(key) for key in keys], dtype="int64")
+        signs = np.where(hashes & SIGN_BIT, -1.0, 1.0)
+        # The word's own hash comes first; bigrams are mixed from it
+        return hashes[0], hashes % self.dim, (signs * weights).astype("float32")
+
+    def _flush_pending(self):
+        # Append features of words first seen in this batch to the flat arrays
+        if not self._pending:
+            return
+        lengths = [len(buckets) for _, buckets, _ in self._pending]
+        self._word_hashes = np.concatenate([self._word_hashes, [word_hash for word_hash, _, _ in self._pending]])
+        self._offsets = np.concatenate([self._offsets, self._offsets[-1] + np.cumsum(lengths)])
+        self._buckets = np.concatenate([self._buckets] + [buckets for _, buckets, _ in self._pending])
+        self._weights = np.concatenate([self._weights] + [weights for _, _, weights in self._pending])
+        self._pending = []
+
+    def _tokenize(self, texts: list[str]):
+        # Word ids of all texts, concatenated, and the text each belongs to
+        if len(self.vocabulary) > self.max_vocabulary:
+            self._reset_vocabulary()
+        token_lists = [TOKEN_PATTERN.findall(text.lower()) for text in texts]
+        tokens = list(chain.from_iterable(token_lists))
+        # Dictionary lookups through map() stay in C; only unseen words take the slow path
+        ids = list(map(self.vocabulary.get, tokens))
+        if None in ids:
+            for word in {token for token, i in zip(tokens, ids) if i is None}:
+                self.vocabulary[word] = len(self.vocabulary)
+                self._pending.append(self._word_features(word))
+            self._flush_pending()
+            ids = list(map(self.vocabulary.__getitem__, tokens))
+        lengths = np.fromiter(map(len, token_lists), dtype="int64", count=len(texts))
+        return np.array(ids, dtype="int64"), np.repeat(np.arange(len(texts)), lengths)
+
+    def counts(self, texts: list[str]) -> np.ndarray:
+        # Raw signed feature counts, one row of `dim` buckets per text
+        with self.lock:
+            words, rows = self._tokenize(texts)
+            return self._accumulate(words, rows, len(texts))
+
+    def _accumulate(self, words, rows, n: int) -> np.ndarray:
+        # Count each distinct word once per text, then expand it into its features
+        pairs, counts = np.unique(rows * len(self.vocabulary) + words, return_counts=True)
+        pair_rows, pair_words = np.divmod(pairs, max(len(self.vocabulary), 1))
+        starts = self._offsets[pair_words]
+        lengths = self._offsets[pair_words + 1] - starts
+        total = int(lengths.sum())
+        # Positions of every feature of every pair in the flat arrays
+        features = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths - starts, lengths)
+        keys = [np.repeat(pair_rows, lengths) * self.dim + self._buckets[features]]
+        values = [self._weights[features] * np.repeat(counts, lengths)]
+
+        if self.word_bigrams and len(words) > 1:
+            # Bigram hashes are mixed from the two word hashes, so they never need a vocabulary
+            same_text = rows[1:] == rows[:-1]
+            hashes = self._word_hashes[words]
+            mixed = ((hashes[:-1][same_text] * 0x9E3779B1) ^ hashes[1:][same_text]) & 0xFFFFFFFF
+            mixed = (mixed * 0x85EBCA6B) & 0xFFFFFFFF
+            mixed ^= mixed >> 13
+            signs = np.where(mixed & SIGN_BIT, -self.bigram_weight, self.bigram_weight)
+            keys.append(rows[1:][same_text] * self.dim + mixed % self.dim)
+            values.append(signs.astype("float32"))
+
+        vectors = np.bincount(np.concatenate(keys), weights=np.concatenate(values), minlength=n * self.dim)
+        return vectors.reshape(n, self.dim).astype("float32")
+
+    def fit(self, texts):
+        # Learn inverse document frequencies per bucket from a sample of the corpus
+        df = np.zeros(self.dim, dtype="int64")
+        n = 0
+        texts = list(texts)
+        for start in range(0, len(texts), 4096):
+            batch = texts[start:start + 4096]
+            df += (self.counts(batch) != 0).sum(axis=0)
+            n += len(batch)
+        self.idf = (np.log((1 + n) / (1 + df)) + 1).astype("float32")
+        return self
+
+    def embed(self, texts: list[str]):
+        vectors = self.counts(texts)
+        if self.idf is not None:
+            vectors *= self.idf
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
@@ -1,17 +1,42 @@
-from openai import OpenAI
+import openai
+from openai import AsyncOpenAI, OpenAI
 from .base import EmbeddingBackend
 from ..config import Settings
 
 client = OpenAI(api_key=Settings.OPENAI_API_KEY)
+async_client = AsyncOpenAI(api_key=Settings.OPENAI_API_KEY)
 
 class OpenAIEmbeddingBackend(EmbeddingBackend):
-    def __init__(self):
+    transient_errors = (
+        openai.RateLimitError,
+        openai.APIConnectionError,
+        openai.APITimeoutError,
+        openai.InternalServerError,
+    )
+
+    def __init__(self, model_name: str = Settings.EMBEDDING_MODEL,
+                 dimensions: int = Settings.EMBEDDING_DIMENSIONS or None):
         self.client = client
+        self.async_client = async_client
+        self.model = model_name
+        # Shortened vectors are computed by the API, which keeps them normalised
+        self.dimensions = dimensions
+        self.options = {"dimensions": dimensions} if dimensions else {}
+        # Vectors of different widths must never share a persisted index
+        self.model_name = f"{model_name}-{dimensions}d" if dimensions else model_name
 
     def embed(self, texts: list[str]):
         response = self.client.embeddings.create(
             input=texts,
-            model="text-embedding-3-small"
+            model=self.model,
+            **self.options
+        )
+        return [data.embedding for data in response.data]
+
+    async def aembed(self, texts: list[str]):
+        response = await self.async_client.embeddings.create(
+            input=texts,
+            model=self.model,
+            **self.options
         )
         return [data.embedding for data in response.data]
-    
\ No newline at end of file
@@ -1,9 +1,76 @@
-from sentence_transformers import SentenceTransformer
+import atexit
+import threading
+import time
 from app.embeddings.base import EmbeddingBackend
 
+
 class SentenceTransformerBackend(EmbeddingBackend):
-    def __init__(self):
-        self.model = SentenceTransformer("all-MiniLM-L6-v2")
+    # The model is loaded on first use, not at import. With processes > 1, large calls are spread
+    # over a pool of encoder processes, one per core.
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", batch_size: int = 64, normalize: bool = True,
+                 device: str = None, processes: int = 0, pool_min_texts: int = 1024):
+        # Unnormalised vectors are not interchangeable with normalised ones in a persisted index
+        self.model_name = model_name if normalize else f"{model_name}-unnormalized"
+        self.model_id = model_name
+        self.batch_size = batch_size
+        self.normalize = normalize
+        self.device = device
+        self.processes = processes
+        self.pool_min_texts = pool_min_texts
+        self.lock = threading.Lock()
+        self.pool_lock = threading.Lock()
+        self._model = None
+        self._pool = None
+
+        self.texts_embedded = 0
+        self.seconds = 0.0
+        self.last_batch = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self.lock:
+                if self._model is None:
+                    # Importing sentence_transformers pulls in torch; defer that too
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(self.model_id, device=self.device)
+        return self._model
+
+    def _encode_pool(self, texts: list[str]):
+        # One pool for the life of the backend; its queues serve one call at a time
+        with self.pool_lock:
+            if self._pool is None:
+                self._pool = self.model.start_multi_process_pool(target_devices=["cpu"] * self.processes)
+                atexit.register(self.close)
+            return self.model.encode_multi_process(
+                texts, self._pool, batch_size=self.batch_size, normalize_embeddings=self.normalize,
+            )
 
     def embed(self, texts: list[str]):
-        return self.model.encode(texts).tolist()
+        start = time.perf_counter()
+        if self.processes > 1 and len(texts) >= self.pool_min_texts:
+            vectors = self._encode_pool(texts)
+        else:
+            vectors = self.model.encode(texts, batch_size=self.batch_size, normalize_embeddings=self.normalize)
+        self._record(len(texts), time.perf_counter() - start)
+        return vectors.tolist()
+
+    def _record(self, count: int, seconds: float):
+        with self.lock:
+            self.texts_embedded += count
+            self.seconds += seconds
+            self.last_batch = {"texts": count, "seconds": seconds, "texts_per_s": count / seconds if seconds else 0.0}
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "texts_embedded": self.texts_embedded,
+                "texts_per_s": self.texts_embedded / self.seconds if self.seconds else 0.0,
+                "last_batch": self.last_batch,
+            }
+
+    def close(self):
+        with self.pool_lock:
+            if self._pool is not None:
+                self._model.stop_multi_process_pool(self._pool)
+                self._pool = None
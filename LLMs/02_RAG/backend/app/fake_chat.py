@@ -0,0 +1,86 @@
+import asyncio
+import hashlib
+import threading
+import time
+from types import SimpleNamespace
+
+
+def _response(tokens, usage):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="".join(tokens)))], usage=usage)
+
+
+def _delta(token):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))], usage=None)
+
+
+class _Completions:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def create(self, model: str, messages: list, temperature: float = 0.0, stream: bool = False,
+               stream_options: dict = None):
+        tokens, usage = self.owner.reply_tokens(messages)
+        time.sleep(self.owner.first_token_latency)
+        if stream:
+            return self._stream(tokens, usage if stream_options and stream_options.get("include_usage") else None)
+        time.sleep(len(tokens) * self.owner.token_latency)
+        return _response(tokens, usage)
+
+    def _stream(self, tokens, usage):
+        for token in tokens:
+            time.sleep(self.owner.token_latency)
+            yield _delta(token)
+        if usage is not None:
+            yield SimpleNamespace(choices=[], usage=usage)
+
+
+class _AsyncCompletions(_Completions):
+    async def create(self, model: str, messages: list, temperature: float = 0.0, stream: bool = False,
+                     stream_options: dict = None):
+        tokens, usage = self.owner.reply_tokens(messages)
+        await asyncio.sleep(self.owner.first_token_latency)
+        if stream:
+            return self._astream(tokens, usage if stream_options and stream_options.get("include_usage") else None)
+        await asyncio.sleep(len(tokens) * self.owner.token_latency)
+        return _response(tokens, usage)
+
+    async def _astream(self, tokens, usage):
+        for token in tokens:
+            await asyncio.sleep(self.owner.token_latency)
+            yield _delta(token)
+        if usage is not None:
+            yield SimpleNamespace(choices=[], usage=usage)
+
+
+class FakeChatClient:
+    # Deterministic local stand-in for the OpenAI chat client (client.chat.completions.create),
+    # for tests and benchmarks. Latency is split into time to first token and time per token.
+    def __init__(self, first_token_latency: float = 0.0, token_latency: float = 0.0, answer_tokens: int = 50):
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.answer_tokens = answer_tokens
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.prompt_chars = 0
+        self.chat = SimpleNamespace(completions=self._completions())
+
+    def _completions(self):
+        return _Completions(self)
+
+    def reply_tokens(self, messages: list):
+        # The same prompt always gets the same answer; usage counts 4 prompt characters per token
+        prompt = "".join(message["content"] for message in messages)
+        with self.lock:
+            self.calls += 1
+            self.prompt_chars += len(prompt)
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        tokens = [f"{digest[i % len(digest)]}{i} " for i in range(self.answer_tokens)]
+        usage = SimpleNamespace(prompt_tokens=len(prompt) // 4 + 1, completion_tokens=len(tokens),
+                                total_tokens=len(prompt) // 4 + 1 + len(tokens))
+        return tokens, usage
+
+
+class FakeAsyncChatClient(FakeChatClient):
+    # Same as FakeChatClient, with an awaitable create() like AsyncOpenAI
+    def _completions(self):
+        return _AsyncCompletions(self)
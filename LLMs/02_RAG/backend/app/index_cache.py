@@ -0,0 +1,145 @@
+import fcntl
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from .chunker import iter_chunks
+from .ingest import ingest_document
+from .sharded_store import create_store, load_store
+from .vector_store import VectorStore
+
+MANIFEST_FILE = "manifest.json"
+LOCK_FILE = "build.lock"
+
+# Index options that only affect queries, so changing them never forces a rebuild
+QUERY_OPTIONS = ("nprobe", "ef_search", "rerank")
+
+
+def hash_file(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_manifest(index_dir: str):
+    path = os.path.join(index_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_manifest(index_dir: str, manifest: dict):
+    # Manifest is written last and atomically, so a crash mid-save never looks like a valid index
+    path = os.path.join(index_dir, MANIFEST_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def build_lock(index_dir: str, shared: bool = False, blocking: bool = True):
+    # Only one worker checks, rebuilds or writes to the index at a time; the others then load its
+    # result. Readers take it shared, so they never load a store halfway through a save.
+    # Without blocking, a lock held elsewhere raises BlockingIOError.
+    os.makedirs(index_dir, exist_ok=True)
+    with open(os.path.join(index_dir, LOCK_FILE), "w") as f:
+        fcntl.flock(f, (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | (0 if blocking else fcntl.LOCK_NB))
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def rebuild_vector_store(old_store: VectorStore, embedder, same_model: bool, skip_doc: str,
+                         index_options: dict) -> VectorStore:
+    # Carry every document of the old store into a store with new settings
+    vector_store = create_store(**index_options)
+    for doc_id, ids in old_store.documents.items():
+        if doc_id == skip_doc or not ids:
+            continue
+        texts = [old_store.texts[i] for i in ids]
+        vectors = old_store.reconstruct(ids) if same_model else embedder.embed(texts)
+        spans = [old_store.chunk_meta(i)[1:] for i in ids]
+        vector_store.add_chunks(ids, vectors, texts, doc_id=doc_id, spans=spans)
+        vector_store.set_document(doc_id, ids, old_store.doc_metadata.get(doc_id))
+    return vector_store
+
+
+def index_config(embedder, index_options: dict) -> dict:
+    # Everything that makes persisted vectors incompatible: the model and the index layout
+    return {
+        "embedding_model": embedder.model_name,
+        "index": {key: value for key, value in index_options.items() if key not in QUERY_OPTIONS},
+    }
+
+
+def open_for_update(index_dir: str, embedder, index_options: dict, skip_doc: str = None):
+    # Call with the build lock held. Returns the store to ingest into, the manifest entries of the
+    # documents it holds, and a store whose vectors may be reused (or None).
+    config = index_config(embedder, index_options)
+    query_options = {key: value for key, value in index_options.items() if key in QUERY_OPTIONS}
+    previous = read_manifest(index_dir)
+    old_store = load_store(index_dir, **query_options) if previous and "config" in previous else None
+    if old_store is not None and previous["config"] == config:
+        return old_store, previous["documents"], None
+
+    if old_store is None:
+        return create_store(**index_options), {}, None
+    # Model or index layout changed; vectors can be copied when the model is the same.
+    # No document counts as ingested, but copied chunks are found in the store and not embedded again.
+    same_model = previous["config"]["embedding_model"] == embedder.model_name
+    vector_store = rebuild_vector_store(old_store, embedder, same_model, skip_doc, index_options)
+    return vector_store, {}, old_store if same_model else None
+
+
+def load_or_build_vector_store(document_path: str, embedder, index_dir: str,
+                               chunk_size: int = 500, overlap: int = 50,
+                               batch_size: int = 4096, index_options: dict = None,
+                               mmap: bool = False, progress=None, dedup_threshold: float = 0.0) -> VectorStore:
+    # progress(**fields), if given, is told the current phase and how far ingestion has got
+    index_options = index_options or {}
+    report = progress or (lambda **fields: None)
+    doc_id = os.path.basename(document_path)
+    config = index_config(embedder, index_options)
+    query_options = {key: value for key, value in index_options.items() if key in QUERY_OPTIONS}
+    source = {"source_hash": hash_file(document_path), "chunk_size": chunk_size, "overlap": overlap,
+              "document_dedup": dedup_threshold}
+
+    # Another worker may be building; it holds the lock until its index is saved
+    report(phase="waiting_for_build_lock")
+    with build_lock(index_dir):
+        # Unchanged document, chunker and model: load the persisted index as is
+        previous = read_manifest(index_dir)
+        if previous and previous.get("config") == config and previous["documents"].get(doc_id) == source:
+            report(phase="loading")
+            return load_store(index_dir, mmap=mmap, **query_options)
+
+        vector_store, documents, reuse = open_for_update(index_dir, embedder, index_options, skip_doc=doc_id)
+
+        # Stream chunks straight into the embedder; only chunks not already stored are embedded
+        size = os.path.getsize(document_path)
+        report(phase="ingesting", document_bytes=size)
+
+        def ingest_progress(position, **fields):
+            report(fraction=round(min(position / size, 1.0), 4) if size else 1.0, **fields)
+
+        with open(document_path) as f:
+            ingest_document(vector_store, doc_id, iter_chunks(f, chunk_size, overlap), embedder.embed,
+                            batch_size=batch_size, reuse=reuse, progress=ingest_progress,
+                            dedup_threshold=dedup_threshold)
+
+        if not vector_store.texts:
+            raise ValueError(f"No text to index in {document_path}")
+
+        report(phase="saving")
+        vector_store.save(index_dir)
+        documents[doc_id] = source
+        write_manifest(index_dir, {"config": config, "documents": documents})
+
+    # Reopen over the files just written so the pages are shared with the other workers
+    report(phase="loading")
+    return load_store(index_dir, mmap=True, **query_options) if mmap else vector_store
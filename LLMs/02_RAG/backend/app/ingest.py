@@ -0,0 +1,68 @@
+from .dedup import ChunkDeduplicator
+from .vector_store import check_metadata, chunk_id
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ingest_document(vector_store, doc_id: str, chunks, embed, batch_size: int = 4096, reuse=None,
+                    metadata: dict = None, progress=None, dedup_threshold: float = 0.0) -> dict:
+    # Upsert a document: only chunks not already stored are embedded, chunks it no longer has are retired.
+    # Vectors of chunks found in `reuse` (a store built with the same embedding model), or of a chunk with
+    # the same text in this store (boilerplate or a copy in another document), are copied instead.
+    # With dedup_threshold, a chunk that repeats an earlier chunk of the document (same text, or estimated
+    # word 3-gram Jaccard similarity >= dedup_threshold when below 1) is dropped before embedding.
+    if metadata is not None:
+        check_metadata(metadata)
+    dedup = ChunkDeduplicator(dedup_threshold) if dedup_threshold else None
+    ids = []
+    embedded = 0
+    duplicates = 0
+    for batch in batched(enumerate(chunks), batch_size):
+        new_ids, new_texts, new_spans = [], [], []
+        for position, chunk in batch:
+            cid = chunk_id(doc_id, position, chunk.text)
+            if dedup is not None and dedup.check(cid, chunk.text) is not None:
+                duplicates += 1
+                continue
+            ids.append(cid)
+            if cid not in vector_store.texts:
+                new_ids.append(cid)
+                new_texts.append(chunk.text)
+                new_spans.append((chunk.start, chunk.end))
+        if not new_ids:
+            continue
+
+        vectors = [None] * len(new_ids)
+        if reuse is not None:
+            known = [i for i, cid in enumerate(new_ids) if cid in reuse.texts]
+            if known:
+                for i, vector in zip(known, reuse.reconstruct([new_ids[i] for i in known])):
+                    vectors[i] = vector
+        same_text = {i: vector_store.find_text(new_texts[i]) for i, vector in enumerate(vectors) if vector is None}
+        same_text = {i: cid for i, cid in same_text.items() if cid is not None}
+        if same_text:
+            for i, vector in zip(same_text, vector_store.reconstruct(list(same_text.values()))):
+                vectors[i] = vector
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            for i, vector in zip(missing, embed([new_texts[i] for i in missing])):
+                vectors[i] = vector
+            embedded += len(missing)
+
+        vector_store.add_chunks(new_ids, vectors, new_texts, doc_id=doc_id, spans=new_spans)
+        if progress is not None:
+            # position: character offset in the source reached so far
+            progress(chunks=len(ids), embedded=embedded, duplicates=duplicates, position=batch[-1][1].end)
+
+    removed = vector_store.set_document(doc_id, ids, metadata)
+    return {"doc_id": doc_id, "chunks": len(ids), "embedded": embedded, "duplicates": duplicates,
+            "removed": removed}
@@ -1,58 +1,440 @@
+import asyncio
+import io
+import json
 import os
-from fastapi import FastAPI
-from .rag import generate_answer
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, HTTPException, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from .config import Settings
+from .metrics import BATCH_QUESTIONS, REGISTRY, StageTimer
+from .rag import NO_ANSWER, agenerate_answer, astream_answer
+from .embeddings.batching import BatchingEmbeddingBackend
+from .embeddings.coalescing import CoalescingEmbeddingBackend
 
-# # OPTION 1: Local embeddings (free)
-# from app.embeddings.sentence_transformer import SentenceTransformerEmbedding
-# embedder = SentenceTransformerEmbedding()
+# # OPTION 1: Local embeddings (free); processes spreads bulk ingestion over all cores
+# from app.embeddings.sentence_transformer import SentenceTransformerBackend
+# embedder = SentenceTransformerBackend(batch_size=64, processes=os.cpu_count())
 
 # OPTION 2: OpenAI embeddings (higher quality)
 from .embeddings.openai_embedding import OpenAIEmbeddingBackend
-embedder = OpenAIEmbeddingBackend()
+embedder = BatchingEmbeddingBackend(
+    OpenAIEmbeddingBackend(),
+    max_batch_size=Settings.EMBED_BATCH_SIZE,
+    max_batch_tokens=Settings.EMBED_BATCH_TOKENS,
+    max_in_flight=Settings.EMBED_MAX_IN_FLIGHT,
+)
 
+# # OPTION 3: Hashed word/character n-gram embeddings (no network, no model download)
+# from app.embeddings.hashing import HashingEmbeddingBackend
+# embedder = HashingEmbeddingBackend()
 
-from .chunker import chunk_text
-from .vector_store import VectorStore
+# Identical questions arriving together share one embedding call
+embedder = CoalescingEmbeddingBackend(embedder)
 
-app = FastAPI()
 
-# Load document
+from .answer_cache import AnswerCache
+from .chunker import iter_chunks
+from .collection_manager import CollectionManager
+from .context import distinct_hits, pack_context, select_relevant
+from .index_cache import load_or_build_vector_store
+from .ingest import ingest_document
+from .single_flight import SingleFlight
+from .vector_store import FilterError
+from .warmup import WarmUp
+
+index_options = {
+    "index_type": Settings.INDEX_TYPE,
+    "nlist": Settings.INDEX_NLIST,
+    "hnsw_m": Settings.INDEX_HNSW_M,
+    "pq_m": Settings.INDEX_PQ_M,
+    "nprobe": Settings.INDEX_NPROBE,
+    "ef_search": Settings.INDEX_EF_SEARCH,
+    "rerank": Settings.INDEX_RERANK,
+    "vector_dtype": Settings.VECTOR_DTYPE,
+    "shards": Settings.INDEX_SHARDS,
+    "pca_dim": Settings.INDEX_PCA_DIM,
+}
+
+# One answer cache per loaded collection, dropped when the collection is evicted
+answer_caches = {}
+ask_flight = SingleFlight("ask")
+
+collections = CollectionManager(
+    Settings.COLLECTIONS_DIR,
+    memory_budget_bytes=Settings.COLLECTIONS_MEMORY_BUDGET_MB * 2**20,
+    index_options=index_options,
+    mmap=Settings.INDEX_MMAP,
+    on_evict=lambda name: answer_caches.pop(name, None),
+)
+
 document_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'knowledge.txt'))
-with open(document_path) as f:
-    raw_text = f.read()
 
-# Chunk document
-chunks = chunk_text(raw_text)
 
-# Create embeddings for chunks
-embeddings = embedder.embed(chunks)
+def load_knowledge_base(report):
+    # Load the persisted index, embedding only new or changed chunks of the document.
+    # It is served as the default collection, and like any other may be evicted and reloaded.
+    vector_store = load_or_build_vector_store(
+        document_path,
+        embedder,
+        Settings.INDEX_DIR,
+        chunk_size=Settings.CHUNK_SIZE,
+        overlap=Settings.CHUNK_OVERLAP,
+        index_options=index_options,
+        mmap=Settings.INDEX_MMAP,
+        progress=report,
+        dedup_threshold=Settings.DEDUP_THRESHOLD,
+    )
+    collections.register(Settings.DEFAULT_COLLECTION, vector_store, Settings.INDEX_DIR)
+    report(phase="ready", chunks=len(vector_store.texts))
+
+
+warmup = WarmUp(load_knowledge_base, max_attempts=Settings.WARMUP_ATTEMPTS)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Ingestion can take minutes against a slow embedding API; the worker starts serving at once
+    # and question endpoints answer 503 until the knowledge base is loaded
+    warmup.start()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+def require_ready():
+    if not warmup.ready:
+        raise HTTPException(status_code=503, detail=warmup.status(), headers={"Retry-After": "5"})
+
+
+def get_answer_cache(name: str, dim: int) -> AnswerCache:
+    if name not in answer_caches:
+        answer_caches[name] = AnswerCache(
+            dim=dim,
+            max_entries=Settings.ANSWER_CACHE_SIZE,
+            ttl_seconds=Settings.ANSWER_CACHE_TTL,
+            similarity_threshold=Settings.ANSWER_CACHE_THRESHOLD,
+        )
+    return answer_caches[name]
+
+
+async def get_collection(name: str):
+    # Loading a cold collection reads its files, so it runs in a worker thread
+    try:
+        return await asyncio.to_thread(collections.get, name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Collection {name!r} not found")
+
+
+async def update_collection(name: str, change, create: bool = False):
+    # Writes hold the collection's file lock for all workers (see CollectionManager.update), and
+    # the embedding calls and file writes block, so they run in a worker thread
+    try:
+        return await asyncio.to_thread(collections.update, name, change, create)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Collection {name!r} not found")
+
+
+async def search(vector_store, question_embedding, filter: dict = None):
+    # FAISS releases the GIL, so search runs in a worker thread; a bad filter is the client's error
+    try:
+        hits = await asyncio.to_thread(vector_store.search_hits, question_embedding, fetch_k(),
+                                       filter=filter)
+    except FilterError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return relevant(hits)
+
+
+def fetch_k() -> int:
+    return Settings.SEARCH_K * max(Settings.SEARCH_FETCH_FACTOR, 1)
+
+
+def relevant(hits):
+    # The best SEARCH_K distinct hits; empty when nothing is close enough to the question
+    hits = distinct_hits(hits, Settings.SEARCH_K, Settings.CONTEXT_DEDUP_THRESHOLD)
+    return select_relevant(hits, Settings.RELEVANCE_MAX_DISTANCE, Settings.RELEVANCE_DROP_OFF)
+
+
+async def no_answer():
+    return NO_ANSWER
+
+
+def build_context(hits):
+    return pack_context(hits, Settings.CONTEXT_TOKEN_BUDGET, Settings.CONTEXT_DEDUP_THRESHOLD)
 
-# Initialize vector store
-vector_store = VectorStore(dim=len(embeddings[0]))
-# Add embeddings and chunks to vector store
-vector_store.add(embeddings, chunks)
 
 @app.get("/")
 def health():
+    # Liveness: the process is up, whether or not warm-up has finished. A warm-up that has used up
+    # its retries fails this probe, so the orchestrator restarts the worker.
+    if warmup.failed:
+        return JSONResponse({"status": "failed", **warmup.status()}, status_code=503)
     return {"status": "ok"}
 
 
-@app.post("/ask")
-def ask(request: dict):
-    # Embed user question
+@app.get("/ready")
+def ready():
+    # Readiness: route traffic here only once the knowledge base is loaded
+    status = warmup.status()
+    if not warmup.ready:
+        return JSONResponse(status, status_code=503)
+    return status
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {name: cache.stats() for name, cache in list(answer_caches.items())}
+
+
+@app.get("/collections")
+def list_collections():
+    return {"collections": collections.names(), **collections.stats()}
+
+
+@app.get("/metrics")
+def metrics():
+    # Prometheus text format; every worker process keeps its own counters
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/ask", dependencies=[Depends(require_ready)])
+async def ask(request: dict, response: Response):
+    timer = StageTimer("ask")
+    outcome = "error"
+    # Identical questions in flight together share one answer; only the first one's stages are timed
+    key = (request.get("collection", Settings.DEFAULT_COLLECTION), request.get("user_prompt"),
+           json.dumps(request.get("filter"), sort_keys=True))
+    try:
+        if key in ask_flight:
+            with timer.stage("coalesced"):
+                result, _ = await ask_flight.do(key, lambda: answer_question(request, timer))
+            outcome = "coalesced"
+        else:
+            result, outcome = await ask_flight.do(key, lambda: answer_question(request, timer))
+        return result
+    finally:
+        # Per-stage durations, e.g. "embed;dur=41.20, search;dur=0.35, ..., total;dur=912.04"
+        response.headers["Server-Timing"] = timer.finish(outcome)
+
+
+async def answer_question(request: dict, timer: StageTimer):
     question = request["user_prompt"]
-    question_embedding = embedder.embed([question])[0]
+    name = request.get("collection", Settings.DEFAULT_COLLECTION)
+    with timer.stage("collection"):
+        vector_store = await get_collection(name)
+    filter = request.get("filter")
+    # Cached answers were generated from the whole collection, so filtered questions bypass the cache
+    answer_cache = None if filter else get_answer_cache(name, vector_store.dim)
 
-    # Retrieve relevant chunks
-    relevant_chunks = vector_store.search(question_embedding)
+    # Serve repeated questions from the cache
+    if answer_cache is not None:
+        with timer.stage("cache"):
+            answer_cache.sync(vector_store.version)
+            cached = answer_cache.get(question)
+        if cached is not None:
+            return cached, "cache_exact"
 
-    # Generate grounded answer using LLM
-    answer = generate_answer(question, relevant_chunks)
+    # Embed user question
+    with timer.stage("embed"):
+        question_embedding = (await embedder.aembed([question]))[0]
 
-    return {
+    # A paraphrase of an earlier question can reuse its answer
+    if answer_cache is not None:
+        with timer.stage("cache"):
+            cached = answer_cache.get_similar(question_embedding)
+        if cached is not None:
+            return cached, "cache_semantic"
+
+    # Retrieve relevant chunks, optionally only from documents whose metadata matches "filter"
+    with timer.stage("search"):
+        hits = await search(vector_store, question_embedding, filter)
+
+    # Merge overlapping chunks and drop repeats so the prompt stays within the token budget
+    with timer.stage("context"):
+        relevant_chunks, context_stats = build_context(hits)
+
+    # Generate grounded answer using LLM, unless retrieval found nothing relevant to ground it in
+    outcome = "no_match"
+    answer = NO_ANSWER
+    if relevant_chunks:
+        with timer.stage("llm"):
+            answer = await agenerate_answer(question, relevant_chunks)
+        outcome = "generated"
+
+    result = {
         "answer": answer,
-        "sources": relevant_chunks
+        "sources": relevant_chunks,
+        "context": context_stats
     }
+    if answer_cache is not None:
+        answer_cache.put(question, question_embedding, result)
+    return result, outcome
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/ask/stream", dependencies=[Depends(require_ready)])
+async def ask_stream(request: dict):
+    # Retrieval happens up front so sources can be sent before the first token
+    timer = StageTimer("ask_stream")
+    question = request["user_prompt"]
+    with timer.stage("collection"):
+        vector_store = await get_collection(request.get("collection", Settings.DEFAULT_COLLECTION))
+    with timer.stage("embed"):
+        question_embedding = (await embedder.aembed([question]))[0]
+    with timer.stage("search"):
+        hits = await search(vector_store, question_embedding, request.get("filter"))
+    with timer.stage("context"):
+        relevant_chunks, context_stats = build_context(hits)
+
+    async def events():
+        outcome = "error"
+        try:
+            yield sse_event("sources", relevant_chunks)
+            yield sse_event("context", context_stats)
+            if not relevant_chunks:
+                yield sse_event("token", NO_ANSWER)
+                yield sse_event("done", None)
+                outcome = "no_match"
+                return
+            with timer.stage("llm"):
+                async for token in astream_answer(question, relevant_chunks):
+                    yield sse_event("token", token)
+            yield sse_event("done", None)
+            outcome = "generated"
+        finally:
+            timer.finish(outcome)
+
+    # Headers go out before the answer, so they time the retrieval stages only
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Server-Timing": timer.server_timing()})
+
+
+@app.post("/ask_batch", dependencies=[Depends(require_ready)])
+async def ask_batch(request: dict, response: Response):
+    timer = StageTimer("ask_batch")
+    outcome = "error"
+    try:
+        result, outcomes = await answer_batch(request, timer)
+        # The request counts once; how each of its questions was answered is counted separately
+        for question_outcome in outcomes:
+            BATCH_QUESTIONS.inc(outcome=question_outcome)
+        outcome = "answered" if outcomes else "empty"
+        return result
+    finally:
+        response.headers["Server-Timing"] = timer.finish(outcome)
+
+
+async def answer_batch(request: dict, timer: StageTimer):
+    # Returns the response and, per question, how it was answered (the outcomes of /ask, plus
+    # "no_hits" when the search found no chunk at all)
+    questions = request.get("user_prompts")
+    if not isinstance(questions, list) or not all(isinstance(question, str) for question in questions):
+        raise HTTPException(status_code=400, detail="user_prompts must be a list of strings")
+    if not questions:
+        return {"results": []}, []
+    name = request.get("collection", Settings.DEFAULT_COLLECTION)
+    with timer.stage("collection"):
+        vector_store = await get_collection(name)
+    filter = request.get("filter")
+    answer_cache = None if filter else get_answer_cache(name, vector_store.dim)
+    results = [None] * len(questions)
+    outcomes = [None] * len(questions)
+
+    def pending():
+        return [i for i, result in enumerate(results) if result is None]
+
+    if answer_cache is not None:
+        with timer.stage("cache"):
+            answer_cache.sync(vector_store.version)
+            for i, question in enumerate(questions):
+                results[i] = answer_cache.get(question)
+                if results[i] is not None:
+                    outcomes[i] = "cache_exact"
+
+    # Embed the remaining questions in one batch
+    todo = pending()
+    if todo:
+        with timer.stage("embed"):
+            embeddings = dict(zip(todo, await embedder.aembed([questions[i] for i in todo])))
+        if answer_cache is not None:
+            with timer.stage("cache"):
+                for i in todo:
+                    results[i] = answer_cache.get_similar(embeddings[i])
+                    if results[i] is not None:
+                        outcomes[i] = "cache_semantic"
+
+    # Retrieve relevant chunks for every question still unanswered with a single search
+    todo = pending()
+    if todo:
+        with timer.stage("search"):
+            try:
+                hits = await asyncio.to_thread(vector_store.search_hits_many, [embeddings[i] for i in todo],
+                                               fetch_k(), filter=filter)
+            except FilterError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        with timer.stage("context"):
+            contexts = [build_context(relevant(question_hits)) for question_hits in hits]
+
+        # Generate answers concurrently, bounded by the global LLM limit
+        with timer.stage("llm"):
+            answers = await asyncio.gather(
+                *(agenerate_answer(questions[i], chunks) if chunks else no_answer()
+                  for i, (chunks, _) in zip(todo, contexts))
+            )
+        for i, question_hits, answer, (chunks, stats) in zip(todo, hits, answers, contexts):
+            results[i] = {"answer": answer, "sources": chunks, "context": stats}
+            outcomes[i] = "generated" if chunks else "no_match" if question_hits else "no_hits"
+            if answer_cache is not None:
+                answer_cache.put(questions[i], embeddings[i], results[i])
+
+    return {
+        "results": [{"question": question, **result} for question, result in zip(questions, results)]
+    }, outcomes
+
+
+def check_writable(vector_store):
+    if vector_store.read_only:
+        raise HTTPException(status_code=409, detail="Index is served read-only from memory maps (INDEX_MMAP)")
+
+
+@app.post("/documents", dependencies=[Depends(require_ready)])
+async def upsert_document(request: dict):
+    # Add or replace a document; only its new or changed chunks are embedded.
+    # Naming a collection that does not exist yet creates it. "metadata" (e.g. tags, date, source)
+    # can be used to filter searches.
+    name = request.get("collection", Settings.DEFAULT_COLLECTION)
+    doc_id = request["doc_id"]
+    if not request["text"].strip():
+        # Chunks are runs of words, so this would store nothing
+        raise HTTPException(status_code=400, detail=f"Document {doc_id!r} has no text to index")
+    chunks = iter_chunks(io.StringIO(request["text"]), Settings.CHUNK_SIZE, Settings.CHUNK_OVERLAP)
+
+    def upsert(vector_store):
+        check_writable(vector_store)
+        return ingest_document(vector_store, doc_id, chunks, embedder.embed, metadata=request.get("metadata"),
+                               dedup_threshold=Settings.DEDUP_THRESHOLD)
+
+    result = await update_collection(name, upsert, create=True)
+    return {"collection": name, **result}
+
+
+@app.delete("/documents/{doc_id}", dependencies=[Depends(require_ready)])
+async def delete_document(doc_id: str, collection: str = Settings.DEFAULT_COLLECTION):
+    def delete(vector_store):
+        check_writable(vector_store)
+        return vector_store.delete_document(doc_id)
+
+    removed = await update_collection(collection, delete)
+    if not removed:
+        raise HTTPException(status_code=404, detail=f"Document {doc_id!r} not found")
+    return {"collection": collection, "doc_id": doc_id, "removed": removed}
 
 
 # @app.post("/ask_v2")
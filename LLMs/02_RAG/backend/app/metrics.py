@@ -0,0 +1,133 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds, from sub-millisecond cache hits up to slow LLM calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+
+def _labels(names, values) -> str:
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.series = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self.lock:
+            series = self.series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labelnames + ("le",)
+        with self.lock:
+            for key, series in sorted(self.series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_labels(names, key + (f'{bound:g}',))} {count}")
+                lines.append(f"{self.name}_bucket{_labels(names, key + ('+Inf',))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    # Metrics of this worker process, rendered in the Prometheus text exposition format
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "rag_stage_seconds", "Time spent in each stage of a question request", ("endpoint", "stage")))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "rag_request_seconds", "End-to-end time of question requests", ("endpoint",)))
+REQUESTS = REGISTRY.register(Counter(
+    "rag_requests_total", "Question requests by how they were answered", ("endpoint", "outcome")))
+BATCH_QUESTIONS = REGISTRY.register(Counter(
+    "rag_batch_questions_total", "Questions of /ask_batch requests by how they were answered", ("outcome",)))
+LLM_TOKENS = REGISTRY.register(Histogram(
+    "rag_llm_tokens", "Tokens per chat completion call", ("kind",), buckets=TOKEN_BUCKETS))
+SINGLE_FLIGHT = REGISTRY.register(Counter(
+    "rag_single_flight_total", "Calls that ran the work (leader) or shared an identical in-flight call (follower)",
+    ("layer", "role")))
+
+
+def record_usage(usage):
+    # Token counts reported by the chat completion API, when it reports them
+    if usage is None:
+        return
+    LLM_TOKENS.observe(usage.prompt_tokens, kind="prompt")
+    LLM_TOKENS.observe(usage.completion_tokens, kind="completion")
+
+
+class StageTimer:
+    # Times the stages of one request into the stage histogram and a Server-Timing header
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.start = time.perf_counter()
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed
+            STAGE_SECONDS.observe(elapsed, endpoint=self.endpoint, stage=name)
+
+    def finish(self, outcome: str) -> str:
+        # Record the whole request and return its Server-Timing header value
+        total = time.perf_counter() - self.start
+        REQUEST_SECONDS.observe(total, endpoint=self.endpoint)
+        REQUESTS.inc(endpoint=self.endpoint, outcome=outcome)
+        return self.server_timing(total)
+
+    def server_timing(self, total: float = None) -> str:
+        timings = dict(self.timings)
+        if total is not None:
+            timings["total"] = total
+        return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.items())
@@ -1,7 +1,19 @@
-from openai import OpenAI
+import asyncio
+from openai import AsyncOpenAI, OpenAI
 from .config import Settings   
+from .metrics import record_usage
+from .single_flight import SingleFlight
 
 client = OpenAI(api_key=Settings.OPENAI_API_KEY)
+async_client = AsyncOpenAI(api_key=Settings.OPENAI_API_KEY)
+
+# Global cap on concurrent chat completion calls from the async request path
+llm_semaphore = asyncio.Semaphore(Settings.LLM_MAX_CONCURRENCY)
+# Identical prompts in flight at the same time share one completion
+llm_flight = SingleFlight("llm")
+
+# Returned without an LLM call when retrieval finds nothing relevant
+NO_ANSWER = "I don't know"
 
 SYSTEM_PROMPT = """
 You are a helpful assistant.
@@ -9,22 +21,76 @@ Answer ONLY using the provided context.
 If the answer is not in the context, say "I don't know".
 """
 
-def generate_answer(question: str, context_chunks: list[str]):
+def build_messages(question: str, context_chunks: list[str]):
     # Combine context chunks into a single string
     context = "\n".join(context_chunks)
 
     # Create the prompt
     prompt = f"{SYSTEM_PROMPT}\n\nContext:\n{context}\n\nQuestion: {question}\nAnswer:"
 
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+def generate_answer(question: str, context_chunks: list[str]):
     # Call OpenAI API to generate the answer
     response = client.chat.completions.create(
         model="gpt-4o",
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": prompt}
-        ],
+        messages=build_messages(question, context_chunks),
         temperature=0.0
     )
+    record_usage(response.usage)
 
     answer = response.choices[0].message.content.strip()
-    return answer
\ No newline at end of file
+    return answer
+
+def stream_answer(question: str, context_chunks: list[str]):
+    # Yield answer tokens as the model produces them
+    stream = client.chat.completions.create(
+        model="gpt-4o",
+        messages=build_messages(question, context_chunks),
+        temperature=0.0,
+        stream=True,
+        stream_options={"include_usage": True}
+    )
+
+    for event in stream:
+        if event.choices and event.choices[0].delta.content:
+            yield event.choices[0].delta.content
+        if event.usage:
+            # Sent in a final event with no choices
+            record_usage(event.usage)
+
+async def agenerate_answer(question: str, context_chunks: list[str]):
+    return await llm_flight.do((question, tuple(context_chunks)),
+                               lambda: _agenerate_answer(question, context_chunks))
+
+async def _agenerate_answer(question: str, context_chunks: list[str]):
+    async with llm_semaphore:
+        response = await async_client.chat.completions.create(
+            model="gpt-4o",
+            messages=build_messages(question, context_chunks),
+            temperature=0.0
+        )
+    record_usage(response.usage)
+
+    answer = response.choices[0].message.content.strip()
+    return answer
+
+async def astream_answer(question: str, context_chunks: list[str]):
+    # The slot is held until the stream is fully consumed
+    async with llm_semaphore:
+        stream = await async_client.chat.completions.create(
+            model="gpt-4o",
+            messages=build_messages(question, context_chunks),
+            temperature=0.0,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+
+        async for event in stream:
+            if event.choices and event.choices[0].delta.content:
+                yield event.choices[0].delta.content
+            if event.usage:
+                record_usage(event.usage)
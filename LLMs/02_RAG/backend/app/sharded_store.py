@@ -0,0 +1,220 @@
+import heapq
+import json
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .storage import file_stamp
+from .vector_store import DEFAULT_DOCUMENT, STORE_FILE, VectorStore
+
+
+def shard_of(doc_id: str, shards: int) -> int:
+    # Stable across processes, so a document always lands in the same shard
+    return zlib.crc32(doc_id.encode("utf-8")) % shards
+
+
+def create_store(shards: int = 1, **options):
+    # One shard is a plain VectorStore
+    return ShardedVectorStore(shards, **options) if shards > 1 else VectorStore(**options)
+
+
+def load_store(path: str, mmap: bool = False, **query_options):
+    with open(os.path.join(path, STORE_FILE)) as f:
+        sharded = "shards" in json.load(f)
+    return (ShardedVectorStore if sharded else VectorStore).load(path, mmap=mmap, **query_options)
+
+
+class ShardedTexts:
+    # Read-only chunk id -> text view over all shards
+    def __init__(self, shards):
+        self.shards = shards
+
+    def __getitem__(self, chunk_id: int) -> str:
+        for shard in self.shards:
+            text = shard.texts.get(chunk_id)
+            if text is not None:
+                return text
+        raise KeyError(chunk_id)
+
+    def get(self, chunk_id: int, default=None):
+        for shard in self.shards:
+            text = shard.texts.get(chunk_id)
+            if text is not None:
+                return text
+        return default
+
+    def __contains__(self, chunk_id) -> bool:
+        return any(chunk_id in shard.texts for shard in self.shards)
+
+    def __len__(self) -> int:
+        return sum(len(shard.texts) for shard in self.shards)
+
+    def __iter__(self):
+        for shard in self.shards:
+            yield from shard.texts
+
+
+class ShardedVectorStore:
+    # Documents are spread over independent VectorStores by a hash of their id. A query runs on
+    # every shard at once in a thread pool (FAISS releases the GIL) and the per-shard top k are
+    # merged by distance, so latency follows shard size rather than corpus size.
+    def __init__(self, shards: int, **options):
+        self.options = options
+        self.shards = [VectorStore(**options) for _ in range(shards)]
+        self.lock = threading.RLock()
+        self.pool = ThreadPoolExecutor(max_workers=min(shards, os.cpu_count() or 1),
+                                       thread_name_prefix="shard-search")
+        self.texts = ShardedTexts(self.shards)
+        self._saved_versions = [None] * shards
+        self.stamp = None
+
+    @property
+    def dim(self):
+        return next((shard.dim for shard in self.shards if shard.dim is not None), None)
+
+    @property
+    def version(self) -> int:
+        return sum(shard.version for shard in self.shards)
+
+    @property
+    def read_only(self) -> bool:
+        return any(shard.read_only for shard in self.shards)
+
+    @property
+    def documents(self) -> dict:
+        return {doc_id: ids for shard in self.shards for doc_id, ids in shard.documents.items()}
+
+    @property
+    def doc_metadata(self) -> dict:
+        return {doc_id: meta for shard in self.shards for doc_id, meta in shard.doc_metadata.items()}
+
+    def shard_for(self, doc_id: str) -> VectorStore:
+        return self.shards[shard_of(doc_id, len(self.shards))]
+
+    def _shard_of_chunk(self, chunk_id: int) -> VectorStore:
+        for shard in self.shards:
+            if chunk_id in shard.texts:
+                return shard
+        raise KeyError(chunk_id)
+
+    def add(self, embeddings, texts, doc_id: str = DEFAULT_DOCUMENT):
+        self.shard_for(doc_id).add(embeddings, texts, doc_id)
+        self._share_dim()
+
+    def add_chunks(self, ids, embeddings, texts, doc_id: str, spans=None):
+        # Chunks are placed with their document, so each shard holds whole documents
+        self.shard_for(doc_id).add_chunks(ids, embeddings, texts, doc_id=doc_id, spans=spans)
+        self._share_dim()
+
+    def _share_dim(self):
+        # Shards that got no documents still need the dimension to save an empty index
+        dim = self.dim
+        for shard in self.shards:
+            if shard.dim is None:
+                shard.dim = dim
+
+    def set_document(self, doc_id: str, ids, metadata: dict = None) -> int:
+        return self.shard_for(doc_id).set_document(doc_id, ids, metadata)
+
+    def delete_document(self, doc_id: str) -> int:
+        return self.shard_for(doc_id).delete_document(doc_id)
+
+    def chunk_meta(self, chunk_id: int):
+        return self._shard_of_chunk(chunk_id).chunk_meta(chunk_id)
+
+    def reconstruct(self, ids):
+        vectors = [self._shard_of_chunk(int(i)).reconstruct([i])[0] for i in ids]
+        return np.vstack(vectors)
+
+    def find_text(self, text: str):
+        for shard in self.shards:
+            chunk_id = shard.find_text(text)
+            if chunk_id is not None:
+                return chunk_id
+        return None
+
+    def memory_bytes(self) -> int:
+        return sum(shard.memory_bytes() for shard in self.shards)
+
+    def compact(self):
+        for shard in self.shards:
+            shard.compact()
+
+    def train(self):
+        list(self.pool.map(lambda shard: shard.train(), self.shards))
+
+    def search(self, query_embedding, k=3, nprobe=None, ef_search=None, filter=None):
+        return self.search_many([query_embedding], k, nprobe, ef_search, filter)[0]
+
+    def search_many(self, query_embeddings, k=3, nprobe=None, ef_search=None, filter=None):
+        return [[hit.text for hit in row]
+                for row in self.search_hits_many(query_embeddings, k, nprobe, ef_search, filter)]
+
+    def search_hits(self, query_embedding, k=3, nprobe=None, ef_search=None, filter=None):
+        return self.search_hits_many([query_embedding], k, nprobe, ef_search, filter)[0]
+
+    def search_hits_many(self, query_embeddings, k=3, nprobe=None, ef_search=None, filter=None):
+        queries = np.array(query_embeddings).astype("float32")
+        per_shard = list(self.pool.map(
+            lambda shard: shard.search_hits_many(queries, k, nprobe, ef_search, filter), self.shards
+        ))
+        # Global top k: merge the per-shard lists, each already sorted by distance
+        return [
+            list(heapq.merge(*(rows[q] for rows in per_shard), key=lambda hit: hit.distance))[:k]
+            for q in range(len(queries))
+        ]
+
+    def rebuild_shard(self, shard_number: int, embed=None) -> VectorStore:
+        # Rebuild one shard's index from its live chunks, re-embedding them if `embed` is given,
+        # while the other shards keep serving. The new shard is swapped in when complete.
+        old = self.shards[shard_number]
+        shard = VectorStore(**{**self.options, "dim": self.dim})
+        for doc_id, ids in old.documents.items():
+            if not ids:
+                continue
+            texts = [old.texts[i] for i in ids]
+            vectors = embed(texts) if embed is not None else old.reconstruct(ids)
+            spans = [old.chunk_meta(i)[1:] for i in ids]
+            shard.add_chunks(ids, vectors, texts, doc_id=doc_id, spans=spans)
+            shard.set_document(doc_id, ids, old.doc_metadata.get(doc_id))
+        shard.train()
+        # Keep the total version increasing, so caches keyed on it see the change
+        shard.version = old.version + 1
+        with self.lock:
+            self.shards[shard_number] = shard
+            self._saved_versions[shard_number] = None
+        return shard
+
+    @staticmethod
+    def shard_path(path: str, shard_number: int) -> str:
+        return os.path.join(path, f"shard-{shard_number:03d}")
+
+    def save(self, path: str):
+        # Only shards changed since the last save are written
+        with self.lock:
+            os.makedirs(path, exist_ok=True)
+            for n, shard in enumerate(self.shards):
+                if self._saved_versions[n] != (path, shard.version):
+                    shard.save(self.shard_path(path, n))
+                    self._saved_versions[n] = (path, shard.version)
+            store_path = os.path.join(path, STORE_FILE)
+            with open(store_path + ".tmp", "w") as f:
+                json.dump({"shards": len(self.shards), "options": self.options}, f)
+            os.replace(store_path + ".tmp", store_path)
+            self.stamp = file_stamp(store_path)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = False, **query_options):
+        stamp = file_stamp(os.path.join(path, STORE_FILE))
+        with open(os.path.join(path, STORE_FILE)) as f:
+            data = json.load(f)
+        store = cls(data["shards"], **{**data["options"], **query_options})
+        # Shards load in parallel
+        store.shards[:] = store.pool.map(
+            lambda n: VectorStore.load(cls.shard_path(path, n), mmap=mmap, **query_options),
+            range(data["shards"]),
+        )
+        store._saved_versions = [(path, shard.version) for shard in store.shards]
+        store.stamp = stamp
+        return store
@@ -0,0 +1,30 @@
+import asyncio
+from .metrics import SINGLE_FLIGHT
+
+
+class SingleFlight:
+    # Coalesces concurrent calls with the same key: the first caller (leader) runs the work and
+    # every caller that arrives while it is still running (follower) awaits the same result.
+    # Nothing is kept once the call finishes, so this never serves stale results.
+    def __init__(self, layer: str):
+        self.layer = layer
+        self.in_flight = {}  # key -> asyncio.Task
+
+    async def do(self, key, work):
+        # work() returns the awaitable to run when this caller leads
+        task = self.in_flight.get(key)
+        if task is None:
+            SINGLE_FLIGHT.inc(layer=self.layer, role="leader")
+            task = asyncio.ensure_future(work())
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        else:
+            SINGLE_FLIGHT.inc(layer=self.layer, role="follower")
+        # A caller that goes away (client disconnect) must not cancel the work for the others
+        return await asyncio.shield(task)
+
+    def __contains__(self, key) -> bool:
+        return key in self.in_flight
+
+    def __len__(self) -> int:
+        return len(self.in_flight)
@@ -0,0 +1,157 @@
+import json
+import os
+import numpy as np
+
+VECTORS_FILE = "vectors.bin"
+VECTOR_IDS_FILE = "vector_ids.npy"
+TEXTS_FILE = "texts.bin"
+TEXT_IDS_FILE = "text_ids.npy"
+TEXT_OFFSETS_FILE = "text_offsets.npy"
+TEXT_META_FILE = "text_meta.npy"
+TEXT_DOCS_FILE = "text_docs.json"
+
+VECTOR_DTYPES = ("float32", "float16")
+
+
+def _save_npy(path: str, array):
+    # Replace atomically: workers that already mapped the old file keep reading it safely
+    with open(path + ".tmp", "wb") as f:
+        np.save(f, array)
+    os.replace(path + ".tmp", path)
+
+
+def file_stamp(path: str):
+    # Identifies one version of a file; store files are replaced, never rewritten in place, so a
+    # save by any process changes it
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+def _memmap(path: str, dtype):
+    # np.memmap cannot map an empty file
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r")
+
+
+def write_texts(path: str, texts: dict, meta: dict):
+    # Chunk texts as one UTF-8 blob, rows sorted by chunk id, with row offsets into the blob.
+    # meta maps chunk id -> (doc_id, start, end); stored as (document number, start, end) rows.
+    ids = np.array(sorted(texts), dtype="int64")
+    offsets = np.zeros(len(ids) + 1, dtype="int64")
+    rows = np.full((len(ids), 3), -1, dtype="int64")
+    doc_numbers = {}
+    blob_path = os.path.join(path, TEXTS_FILE)
+    with open(blob_path + ".tmp", "wb") as f:
+        for row, i in enumerate(ids.tolist()):
+            data = texts[i].encode("utf-8")
+            f.write(data)
+            offsets[row + 1] = offsets[row] + len(data)
+            doc_id, start, end = meta.get(i, (None, None, None))
+            if doc_id is not None:
+                rows[row, 0] = doc_numbers.setdefault(doc_id, len(doc_numbers))
+            rows[row, 1:] = [-1 if start is None else start, -1 if end is None else end]
+    os.replace(blob_path + ".tmp", blob_path)
+    _save_npy(os.path.join(path, TEXT_IDS_FILE), ids)
+    _save_npy(os.path.join(path, TEXT_OFFSETS_FILE), offsets)
+    _save_npy(os.path.join(path, TEXT_META_FILE), rows)
+    docs_path = os.path.join(path, TEXT_DOCS_FILE)
+    with open(docs_path + ".tmp", "w") as f:
+        json.dump(list(doc_numbers), f)
+    os.replace(docs_path + ".tmp", docs_path)
+
+
+def read_texts(path: str):
+    # Load texts and chunk metadata into plain dicts
+    texts = MmapTexts(path)
+    return {i: texts[i] for i in texts}, {i: texts.meta(i) for i in texts}
+
+
+def write_vectors(path: str, ids, vectors, dtype: str = "float32"):
+    # Raw vectors, rows sorted by chunk id
+    ids = np.asarray(ids, dtype="int64")
+    order = np.argsort(ids)
+    vectors_path = os.path.join(path, VECTORS_FILE)
+    with open(vectors_path + ".tmp", "wb") as f:
+        f.write(np.ascontiguousarray(np.asarray(vectors)[order], dtype=dtype).tobytes())
+    os.replace(vectors_path + ".tmp", vectors_path)
+    _save_npy(os.path.join(path, VECTOR_IDS_FILE), ids[order])
+
+
+def _find_rows(sorted_ids, ids):
+    # Binary search for the rows holding `ids`, and whether each was found
+    ids = np.asarray(ids, dtype="int64")
+    if len(sorted_ids) == 0:
+        return np.zeros(len(ids), dtype="int64"), np.zeros(len(ids), dtype=bool)
+    rows = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+    return rows, sorted_ids[rows] == ids
+
+
+class MmapTexts:
+    # Read-only chunk id -> text mapping; texts are decoded from the shared mapping on access
+    def __init__(self, path: str):
+        self.ids = np.load(os.path.join(path, TEXT_IDS_FILE), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, TEXT_OFFSETS_FILE), mmap_mode="r")
+        self.blob = _memmap(os.path.join(path, TEXTS_FILE), np.uint8)
+        if os.path.exists(os.path.join(path, TEXT_META_FILE)):
+            self.rows = np.load(os.path.join(path, TEXT_META_FILE), mmap_mode="r")
+            with open(os.path.join(path, TEXT_DOCS_FILE)) as f:
+                self.doc_ids = json.load(f)
+        else:
+            # Indexes saved before chunk metadata was recorded have no meta files
+            self.rows = np.full((len(self.ids), 3), -1, dtype="int64")
+            self.doc_ids = []
+
+    def _row(self, chunk_id: int):
+        rows, found = _find_rows(self.ids, [chunk_id])
+        return int(rows[0]) if found[0] else None
+
+    def __getitem__(self, chunk_id: int) -> str:
+        row = self._row(chunk_id)
+        if row is None:
+            raise KeyError(chunk_id)
+        return bytes(self.blob[self.offsets[row]:self.offsets[row + 1]]).decode("utf-8")
+
+    def meta(self, chunk_id: int):
+        # (doc_id, start, end) of a chunk, with None for anything unknown
+        row = self._row(chunk_id)
+        if row is None:
+            raise KeyError(chunk_id)
+        doc, start, end = self.rows[row].tolist()
+        return (
+            None if doc < 0 else self.doc_ids[doc],
+            None if start < 0 else start,
+            None if end < 0 else end,
+        )
+
+    def get(self, chunk_id: int, default=None):
+        row = self._row(chunk_id)
+        return default if row is None else self[chunk_id]
+
+    def __contains__(self, chunk_id) -> bool:
+        return self._row(chunk_id) is not None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids.tolist())
+
+
+class MmapVectors:
+    # Read-only chunk id -> vector lookup over a shared float32/float16 mapping
+    def __init__(self, path: str, dim: int, dtype: str = "float32"):
+        self.ids = np.load(os.path.join(path, VECTOR_IDS_FILE), mmap_mode="r")
+        self.vectors = _memmap(os.path.join(path, VECTORS_FILE), dtype).reshape(-1, dim)
+
+    def __contains__(self, chunk_id) -> bool:
+        return bool(_find_rows(self.ids, [chunk_id])[1][0])
+
+    def get(self, ids):
+        rows, found = _find_rows(self.ids, ids)
+        if not found.all():
+            raise KeyError(np.asarray(ids)[~found].tolist())
+        return np.asarray(self.vectors[rows], dtype="float32")
@@ -1,20 +1,649 @@
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
 import faiss
 import numpy as np
+from .storage import MmapTexts, MmapVectors, VECTOR_DTYPES, file_stamp, read_texts, write_texts, write_vectors
+
+INDEX_FILE = "index.faiss"
+STORE_FILE = "store.json"
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq", "sq8", "pq")
+IVF_TYPES = ("ivf_flat", "ivf_pq", "pq")
+# Indexes that must see sample vectors before anything can be added
+TRAINED_TYPES = ("ivf_flat", "ivf_pq", "sq8", "pq")
+# Indexes that keep only compressed codes; exact vectors live in the vector file
+LOSSY_TYPES = ("ivf_pq", "sq8", "pq")
+DEFAULT_DOCUMENT = "default"
+# Operators of a range filter, e.g. {"date": {"gte": "2024-01-01", "lt": "2025-01-01"}}
+RANGE_OPERATORS = {
+    "gt": lambda value, bound: value > bound,
+    "gte": lambda value, bound: value >= bound,
+    "lt": lambda value, bound: value < bound,
+    "lte": lambda value, bound: value <= bound,
+}
+
+
+class ReadOnlyStoreError(RuntimeError):
+    pass
+
+
+class ReadWriteLock:
+    # Any number of readers at once, or a single writer
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.readers = 0
+        self.writing = False
+
+    @contextmanager
+    def read(self):
+        with self.condition:
+            self.condition.wait_for(lambda: not self.writing)
+            self.readers += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.readers -= 1
+                self.condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self.condition:
+            self.condition.wait_for(lambda: not self.writing and not self.readers)
+            self.writing = True
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.writing = False
+                self.condition.notify_all()
+
+
+class FilterError(ValueError):
+    # A malformed search filter: the caller's mistake, unlike other errors of a search
+    pass
+
+
+@dataclass
+class SearchHit:
+    id: int
+    text: str
+    doc_id: str = None
+    start: int = None  # character offsets of the chunk in its source document, when known
+    end: int = None
+    distance: float = None  # squared L2 distance to the query; exact when re-ranked
+
+
+def check_metadata(metadata: dict):
+    if not isinstance(metadata, dict):
+        raise ValueError("Document metadata must be an object")
+    for key, value in metadata.items():
+        if isinstance(value, dict) or (isinstance(value, list) and any(isinstance(v, (dict, list)) for v in value)):
+            raise ValueError(f"Metadata value of {key!r} must be a scalar or a list of scalars")
+
+
+def check_filter(filter: dict):
+    if not isinstance(filter, dict):
+        raise FilterError("Filter must be an object")
+    for key, condition in filter.items():
+        if isinstance(condition, dict):
+            unknown = set(condition) - set(RANGE_OPERATORS)
+            if unknown:
+                raise FilterError(f"Unknown filter operators {sorted(unknown)}, expected {list(RANGE_OPERATORS)}")
+            values = list(condition.values())
+        else:
+            values = condition if isinstance(condition, list) else [condition]
+        if any(isinstance(value, (dict, list)) for value in values):
+            raise FilterError(f"Filter condition of {key!r} must be a value, a list of values or a range")
+
+
+def chunk_id(doc_id: str, position: int, text: str) -> int:
+    # Stable 63-bit id: the same chunk of the same document always maps to the same id
+    digest = hashlib.sha256(f"{doc_id}\0{position}\0{text}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "little") & 0x7FFF_FFFF_FFFF_FFFF
+
+
+def build_index(dim: int, index_type: str = "flat", n_train: int = 0, nlist: int = 1024,
+                hnsw_m: int = 32, pq_m: int = 16, pq_nbits: int = 8, pca_dim: int = 0):
+    if pca_dim:
+        # Vectors are projected onto their top pca_dim principal components on the way in, for
+        # both adds and queries; the projection is trained with the index and saved inside it
+        if not 0 < pca_dim < dim:
+            raise ValueError(f"pca_dim {pca_dim} must be between 1 and dim {dim} - 1")
+        index = build_index(pca_dim, index_type, n_train, nlist, hnsw_m, pq_m, pq_nbits)
+        return faiss.IndexPreTransform(faiss.PCAMatrix(dim, pca_dim), index)
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dim)
+    if index_type == "hnsw":
+        return faiss.IndexHNSWFlat(dim, hnsw_m)
+    if index_type == "sq8":
+        # One byte per dimension instead of four
+        return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit)
+    # IVF needs at least one training point per list; PQ needs one per codebook entry
+    nlist = max(1, min(nlist, n_train))
+    quantizer = faiss.IndexFlatL2(dim)
+    if index_type == "ivf_flat":
+        return faiss.IndexIVFFlat(quantizer, dim, nlist)
+    if index_type in ("ivf_pq", "pq"):
+        if dim % pq_m:
+            raise ValueError(f"dim {dim} is not divisible by pq_m {pq_m}")
+        pq_nbits = max(1, min(pq_nbits, int(np.log2(max(n_train, 2)))))
+        # Plain PQ is IVF-PQ with a single list: an exhaustive scan over the codes that, unlike
+        # IndexPQ, accepts ID selectors and stores ids natively
+        return faiss.IndexIVFPQ(quantizer, dim, 1 if index_type == "pq" else nlist, pq_m, pq_nbits)
+    raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+
 
 class VectorStore:
-    def __init__(self, dim: int):
-        # Create FAISS index using L2 distance
-        self.index = faiss.IndexFlatL2(dim)
-        self.texts = []
-
-    def add(self, embeddings, texts):
-        # Store embeddings in FAISS index
-        self.index.add(np.array(embeddings).astype("float32"))
-        self.texts.extend(texts)
-
-    def search(self, query_embedding, k=3):
-        # Search for top-k similar vectors
-        distances, indices = self.index.search(
-            np.array([query_embedding]).astype("float32"), k
-        )
-        return [self.texts[i] for i in indices[0]]
+    def __init__(self, dim: int = None, index_type: str = "flat", nlist: int = 1024, hnsw_m: int = 32,
+                 pq_m: int = 16, pq_nbits: int = 8, nprobe: int = 16, ef_search: int = 64,
+                 train_size: int = 50_000, compact_ratio: float = 0.2, vector_dtype: str = "float32",
+                 rerank: int = 0, brute_force_limit: int = 4096, pca_dim: int = 0):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+        if vector_dtype not in VECTOR_DTYPES:
+            raise ValueError(f"Unknown vector dtype {vector_dtype!r}, expected one of {VECTOR_DTYPES}")
+        self.dim = dim
+        self.index_type = index_type
+        self.index_params = {"nlist": nlist, "hnsw_m": hnsw_m, "pq_m": pq_m, "pq_nbits": pq_nbits, "pca_dim": pca_dim}
+        # A PCA projection must be trained, and like compressed codes cannot give back exact vectors
+        self.needs_training = index_type in TRAINED_TYPES or bool(pca_dim)
+        self.lossy = index_type in LOSSY_TYPES or bool(pca_dim)
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.train_size = train_size
+        self.compact_ratio = compact_ratio
+        self.vector_dtype = vector_dtype
+        # Lossy indexes fetch rerank * k candidates and re-score them against exact vectors
+        self.rerank = rerank
+        # Filters matching at most this many chunks are answered by exact search over just those vectors
+        # (except on flat indexes, whose filtered scan is already exact and faster)
+        self.brute_force_limit = brute_force_limit
+        self.lock = threading.RLock()
+        # FAISS searches run outside `lock` and read this; changing the index in place writes it
+        self.index_lock = ReadWriteLock()
+        # Serializes saves, which write their files outside `lock` so searches are not held up
+        self.save_lock = threading.Lock()
+        # file_stamp of the saved store.json this store matches (see CollectionManager)
+        self.stamp = None
+        # Set when loaded over shared memory-mapped files, which must never be written to
+        self.read_only = False
+        # Exact vectors from the last save, plus those added since for lossy indexes
+        self.vectors = None
+        self._new_vectors = {}
+
+        self.texts = {}       # live chunk id -> text (MmapTexts when memory-mapped)
+        self.meta = {}        # live chunk id -> (doc_id, start, end); read from texts when memory-mapped
+        self.documents = {}   # document id -> chunk ids in document order
+        self.doc_metadata = {}  # document id -> metadata shared by all its chunks
+        # hash(text) -> a live chunk id with that text, built on first use by find_text
+        self._text_ids = None
+        # Inverted index: metadata key -> value -> document ids; "doc_id" is always indexed
+        self.metadata_index = {}
+        self._filter_cache = {}
+        # Deleted ids still physically in the index; excluded from searches until compaction
+        self.tombstones = set()
+        self._tombstone_selector = None
+        # Bumped on every change, so caches derived from this store know when to invalidate
+        self.version = 0
+
+        # Without a dim the index is created on the first add; trained indexes wait for enough vectors
+        self.index = None
+        self._pending = []
+        if dim is not None and not self.needs_training:
+            self.index = self._new_index()
+
+    def _new_index(self, n_train: int = 0):
+        index = build_index(self.dim, self.index_type, n_train=n_train, **self.index_params)
+        if self.index_type not in IVF_TYPES:
+            # Map FAISS rows to our stable chunk ids
+            return faiss.IndexIDMap2(index)
+        # IVF stores ids natively; the hashtable lets vectors be looked up by id
+        ivf = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexPreTransform) else index
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+        return index
+
+    def _check_writable(self):
+        if self.read_only:
+            raise ReadOnlyStoreError("This vector store is memory-mapped read-only")
+
+    def add(self, embeddings, texts, doc_id: str = DEFAULT_DOCUMENT):
+        # Append chunks to a document, with ids derived from their position
+        with self.lock:
+            if doc_id not in self.documents:
+                self._index_metadata(doc_id, {})
+            doc_chunks = self.documents.setdefault(doc_id, [])
+            ids = [chunk_id(doc_id, len(doc_chunks) + i, text) for i, text in enumerate(texts)]
+            self.add_chunks(ids, embeddings, texts, doc_id=doc_id)
+            doc_chunks.extend(ids)
+
+    def add_chunks(self, ids, embeddings, texts, doc_id: str = None, spans=None):
+        # Store embeddings in FAISS index under the given ids; spans are (start, end) source offsets
+        vectors = np.array(embeddings).astype("float32")
+        ids = np.array(ids, dtype="int64")
+        with self.lock:
+            self._check_writable()
+            # A re-added id must not also linger in the index as a tombstone
+            if self.tombstones.intersection(ids.tolist()):
+                self.compact()
+            self.texts.update(zip(ids.tolist(), texts))
+            if self._text_ids is not None:
+                for i, text in zip(ids.tolist(), texts):
+                    self._text_ids.setdefault(hash(text), i)
+            spans = spans or [(None, None)] * len(ids)
+            self.meta.update((i, (doc_id, start, end)) for i, (start, end) in zip(ids.tolist(), spans))
+            if self.lossy:
+                self._new_vectors.update(zip(ids.tolist(), vectors))
+            self.version += 1
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                if not self.needs_training:
+                    self.index = self._new_index()
+            if self.ready:
+                with self.index_lock.write():
+                    self.index.add_with_ids(vectors, ids)
+                return
+            self._pending.append((vectors, ids))
+            if sum(len(v) for v, _ in self._pending) >= self.train_size:
+                self.train()
+
+    def set_document(self, doc_id: str, ids, metadata: dict = None) -> int:
+        # Make `ids` the document's chunks, retiring any it previously had that are not in the list.
+        # Metadata replaces the document's previous metadata; None keeps it.
+        with self.lock:
+            self._check_writable()
+            if metadata is not None:
+                check_metadata(metadata)
+            removed = set(self.documents.get(doc_id, [])) - set(ids)
+            self.documents[doc_id] = list(ids)
+            if metadata is not None or doc_id not in self.doc_metadata:
+                self._unindex_metadata(doc_id)
+                self._index_metadata(doc_id, metadata or {})
+            self._delete_ids(removed)
+            self.version += 1
+            return len(removed)
+
+    def delete_document(self, doc_id: str) -> int:
+        with self.lock:
+            self._check_writable()
+            ids = self.documents.pop(doc_id, [])
+            self._unindex_metadata(doc_id)
+            self._delete_ids(ids)
+            return len(ids)
+
+    def _index_metadata(self, doc_id: str, metadata: dict):
+        self.doc_metadata[doc_id] = metadata
+        for key, value in [("doc_id", doc_id), *metadata.items()]:
+            # A list value, such as tags, is indexed under each of its elements
+            for item in value if isinstance(value, list) else [value]:
+                self.metadata_index.setdefault(key, {}).setdefault(item, set()).add(doc_id)
+
+    def _unindex_metadata(self, doc_id: str):
+        metadata = self.doc_metadata.pop(doc_id, None)
+        if metadata is None:
+            return
+        for key, value in [("doc_id", doc_id), *metadata.items()]:
+            values = self.metadata_index.get(key, {})
+            for item in value if isinstance(value, list) else [value]:
+                values.get(item, set()).discard(doc_id)
+                if not values.get(item, True):
+                    del values[item]
+
+    def _rebuild_metadata_index(self):
+        self.metadata_index = {}
+        metadata, self.doc_metadata = self.doc_metadata, {}
+        for doc_id in self.documents:
+            self._index_metadata(doc_id, metadata.get(doc_id, {}))
+
+    def matching_documents(self, filter: dict) -> set:
+        # Documents whose metadata satisfies every condition of the filter. A condition is a value
+        # (equality, or membership for list metadata), a list of values (any of them) or a range.
+        check_filter(filter)
+        with self.lock:
+            matches = None
+            for key, condition in filter.items():
+                values = self.metadata_index.get(key, {})
+                if isinstance(condition, dict):
+                    selected = [value for value in values if self._in_range(value, condition)]
+                else:
+                    selected = condition if isinstance(condition, list) else [condition]
+                docs = set().union(*(values.get(value, set()) for value in selected))
+                matches = docs if matches is None else matches & docs
+            return set(self.documents) if matches is None else matches
+
+    @staticmethod
+    def _in_range(value, condition: dict) -> bool:
+        try:
+            return all(RANGE_OPERATORS[op](value, bound) for op, bound in condition.items())
+        except TypeError:
+            # Values of another type (a number against a date string) never match
+            return False
+
+    def filter_ids(self, filter: dict):
+        # Live chunk ids of the matching documents, with the FAISS selector over them; cached per
+        # filter until the store changes
+        with self.lock:
+            key = json.dumps(filter, sort_keys=True)
+            cached = self._filter_cache.get(key)
+            if cached is not None and cached[0] == self.version:
+                return cached[1], cached[2]
+            docs = self.matching_documents(filter)
+            ids = np.array([i for doc_id in docs for i in self.documents[doc_id]], dtype="int64")
+            # A flat index scans everything anyway and is exact, so the selector is always cheapest there
+            exact = len(ids) <= self.brute_force_limit and self.index_type != "flat"
+            selector = None if exact else faiss.IDSelectorBatch(ids)
+            if len(self._filter_cache) >= 256:
+                self._filter_cache.clear()
+            self._filter_cache[key] = (self.version, ids, selector)
+            return ids, selector
+
+    def _delete_ids(self, ids):
+        if not ids:
+            return
+        for i in ids:
+            text = self.texts.pop(i, None)
+            if self._text_ids is not None and text is not None and self._text_ids.get(hash(text)) == i:
+                del self._text_ids[hash(text)]
+            self.meta.pop(i, None)
+            self._new_vectors.pop(i, None)
+        self.tombstones.update(ids)
+        self._tombstone_selector = None
+        self.version += 1
+        if self.ready and len(self.tombstones) > self.compact_ratio * self.index.ntotal:
+            self.compact()
+
+    def chunk_meta(self, chunk_id: int):
+        # (doc_id, start, end) of a live chunk
+        if isinstance(self.texts, MmapTexts):
+            return self.texts.meta(chunk_id)
+        return self.meta.get(chunk_id, (None, None, None))
+
+    def memory_bytes(self) -> int:
+        # Rough resident size: index codes and ids, plus texts and vectors held in Python.
+        # Memory-mapped texts and vectors live in the shared page cache and are not counted.
+        dim = self.dim or 0
+        # Codes are built from the projected vectors when PCA is on
+        index_dim = self.index_params["pca_dim"] or dim
+        if self.index_type in ("ivf_pq", "pq"):
+            code_size = self.index_params["pq_m"] * self.index_params["pq_nbits"] // 8
+        elif self.index_type == "sq8":
+            code_size = index_dim
+        else:
+            code_size = index_dim * 4
+        if self.index_type == "hnsw":
+            code_size += self.index_params["hnsw_m"] * 2 * 4  # graph links
+        ntotal = self.index.ntotal if self.ready else sum(len(i) for _, i in self._pending)
+        size = ntotal * (code_size + 16) + len(self._new_vectors) * dim * 4
+        if not self.ready:
+            size += ntotal * dim * 4
+        if not isinstance(self.texts, MmapTexts):
+            size += sum(len(text) + 100 for text in self.texts.values())
+        return size
+
+    def reconstruct(self, ids):
+        # Exact vectors by chunk id
+        with self.lock:
+            if self.lossy:
+                return self._lookup_vectors(ids, self._new_vectors, self.vectors)
+            if not self.ready and self._pending:
+                # Still collecting vectors to train on; looking some up must not train early
+                pending = {int(i): vector for vectors, chunk_ids in self._pending
+                           for i, vector in zip(chunk_ids, vectors)}
+                return np.vstack([pending[int(i)] for i in ids])
+            self.train()
+            return self.index.reconstruct_batch(np.asarray(ids, dtype="int64"))
+
+    def find_text(self, text: str):
+        # A live chunk id holding exactly this text, or None. Identical chunks of other documents
+        # (shared boilerplate, copies of a document) then copy its vector instead of being embedded.
+        with self.lock:
+            if self._text_ids is None:
+                self._text_ids = {}
+                for i, chunk_text in self.texts.items():
+                    self._text_ids.setdefault(hash(chunk_text), i)
+            i = self._text_ids.get(hash(text))
+            return i if i is not None and self.texts.get(i) == text else None
+
+    @staticmethod
+    def _lookup_vectors(ids, new_vectors: dict, saved):
+        # Exact vectors of a lossy store: added since the last save, otherwise from the saved file
+        vectors = [new_vectors.get(int(i)) for i in ids]
+        on_disk = [n for n, vector in enumerate(vectors) if vector is None]
+        if on_disk:
+            for n, vector in zip(on_disk, saved.get([ids[n] for n in on_disk])):
+                vectors[n] = vector
+        return np.vstack(vectors)
+
+    def compact(self):
+        # Physically drop tombstoned vectors from the index
+        with self.lock:
+            if not self.tombstones:
+                return
+            self._check_writable()
+            dead = np.array(list(self.tombstones), dtype="int64")
+            if not self.ready:
+                self._pending = [(v[~np.isin(i, dead)], i[~np.isin(i, dead)]) for v, i in self._pending]
+            elif self.index_type == "hnsw":
+                # HNSW graphs cannot delete; rebuild from the live vectors
+                live = list(self.texts)
+                index = self._new_index(n_train=len(live))
+                if live:
+                    vectors = self.reconstruct(live)
+                    if self.needs_training:
+                        index.train(self._training_sample(vectors))
+                    index.add_with_ids(vectors, np.array(live, dtype="int64"))
+                self.index = index
+            else:
+                with self.index_lock.write():
+                    self.index.remove_ids(dead)
+            self.tombstones.clear()
+            self._tombstone_selector = None
+
+    @property
+    def ready(self) -> bool:
+        # Vectors can be added to and searched in the index
+        return self.index is not None and self.index.is_trained
+
+    def train(self):
+        # Train on the vectors buffered so far, then add them
+        with self.lock:
+            if self.ready or self.dim is None:
+                return
+            if not self._pending:
+                # Nothing to train on yet. An empty untrained index can still be saved, and is
+                # trained once vectors arrive (a shard that got no documents, say).
+                if self.index is None:
+                    self.index = self._new_index()
+                return
+            vectors = np.vstack([v for v, _ in self._pending])
+            ids = np.concatenate([i for _, i in self._pending])
+            self._pending = []
+            self.index = self._new_index(n_train=len(vectors))
+            self.index.train(self._training_sample(vectors))
+            self.index.add_with_ids(vectors, ids)
+
+    def _training_sample(self, vectors):
+        # PCA needs at least pca_dim samples. A smaller corpus has no variance outside the span of its
+        # vectors, so the missing samples are noise too faint to move the real principal components.
+        missing = self.index_params["pca_dim"] - len(vectors)
+        if missing <= 0:
+            return vectors
+        rng = np.random.default_rng(0)
+        scale = 1e-4 * (float(vectors.std()) or 1.0)
+        noise = vectors.mean(axis=0) + scale * rng.standard_normal((missing, self.dim))
+        return np.vstack([vectors, noise.astype("float32")])
+
+    def search_params(self, nprobe=None, ef_search=None, selector=None):
+        options = {}
+        if selector is not None:
+            # Filter selectors only admit live chunks, so tombstones need no separate exclusion
+            options["sel"] = selector
+        elif self.tombstones:
+            if self._tombstone_selector is None:
+                self._tombstone_selector = faiss.IDSelectorNot(
+                    faiss.IDSelectorBatch(np.array(list(self.tombstones), dtype="int64"))
+                )
+            options["sel"] = self._tombstone_selector
+        if self.index_type in IVF_TYPES:
+            return faiss.SearchParametersIVF(nprobe=nprobe or self.nprobe, **options)
+        if self.index_type == "hnsw":
+            return faiss.SearchParametersHNSW(efSearch=ef_search or self.ef_search, **options)
+        return faiss.SearchParameters(**options) if options else None
+
+    def search(self, query_embedding, k=3, nprobe=None, ef_search=None, filter=None):
+        return self.search_many([query_embedding], k, nprobe, ef_search, filter)[0]
+
+    def search_many(self, query_embeddings, k=3, nprobe=None, ef_search=None, filter=None):
+        # filter restricts results to chunks of documents with matching metadata, see matching_documents
+        rows = self._search_ids(query_embeddings, k, nprobe, ef_search, filter)
+        with self.lock:
+            # Chunks deleted while the search ran are left out
+            return [[self.texts[i] for i in row if i in self.texts] for row in rows]
+
+    def search_hits(self, query_embedding, k=3, nprobe=None, ef_search=None, filter=None):
+        return self.search_hits_many([query_embedding], k, nprobe, ef_search, filter)[0]
+
+    def search_hits_many(self, query_embeddings, k=3, nprobe=None, ef_search=None, filter=None):
+        # Like search_many, but each result also carries its chunk id, document and source offsets
+        rows = self._search_rows(query_embeddings, k, nprobe, ef_search, filter)
+        with self.lock:
+            return [
+                [SearchHit(i, self.texts[i], *self.chunk_meta(i), distance=d) for i, d in row if i in self.texts]
+                for row in rows
+            ]
+
+    def _search_ids(self, query_embeddings, k, nprobe, ef_search, filter=None):
+        return [[i for i, _ in row] for row in self._search_rows(query_embeddings, k, nprobe, ef_search, filter)]
+
+    def _search_rows(self, query_embeddings, k, nprobe, ef_search, filter=None):
+        # (chunk id, distance) pairs of the top k of every query, nearest first. The FAISS search runs
+        # outside `lock` over a snapshot of the index and its parameters, so writes and saves only wait
+        # for it when they change the index in place.
+        with self.lock:
+            self.train()
+            if not self.ready:
+                return [[] for _ in query_embeddings]
+            queries = np.array(query_embeddings).astype("float32")
+            selector = None
+            if filter:
+                allowed, selector = self.filter_ids(filter)
+                if selector is None:
+                    return self._exact_search_rows(queries, allowed, k)
+            rerank = self.rerank if self.lossy else 0
+            # The parameters keep their selector alive should a writer drop the store's reference to it
+            index, params = self.index, self.search_params(nprobe, ef_search, selector)
+        # Search all queries in one matrix call; a filter is applied inside the FAISS search
+        with self.index_lock.read():
+            distances, indices = index.search(queries, k * rerank if rerank else k, params=params)
+        if rerank:
+            with self.lock:
+                return [list(zip(*self._rerank(query, row, k))) for query, row in zip(queries, indices)]
+        return [
+            [(int(i), float(d)) for i, d in zip(row, row_distances) if i != -1]
+            for row, row_distances in zip(indices, distances)
+        ]
+
+    def _exact_search_rows(self, queries, ids, k):
+        # Selective filters: scoring the few matching vectors directly beats a filtered index scan
+        if not len(ids):
+            return [[] for _ in queries]
+        vectors = self.reconstruct(ids)
+        distances = (queries ** 2).sum(axis=1)[:, None] - 2 * queries @ vectors.T + (vectors ** 2).sum(axis=1)
+        k = min(k, len(ids))
+        top = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        order = np.take_along_axis(distances, top, axis=1).argsort(axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        return [
+            list(zip(ids[row].tolist(), np.maximum(row_distances[row], 0).tolist()))
+            for row, row_distances in zip(top, distances)
+        ]
+
+    def rerank_candidates(self, query, candidates, k):
+        # Re-score approximate candidates with exact L2 distances
+        return self._rerank(query, candidates, k)[0]
+
+    def _rerank(self, query, candidates, k):
+        # Only live chunks: a candidate may have been deleted since the search found it
+        candidates = np.array([i for i in candidates if i != -1 and i in self.texts], dtype="int64")
+        if not len(candidates):
+            return [], []
+        distances = ((self.reconstruct(candidates) - query) ** 2).sum(axis=1)
+        order = np.argsort(distances)[:k]
+        return candidates[order].tolist(), distances[order].tolist()
+
+    def save(self, path: str):
+        # Only a snapshot is taken under the search lock (the serialized index and copies of the
+        # dicts); the files are written after releasing it
+        with self.save_lock:
+            with self.lock:
+                self._check_writable()
+                self.train()
+                index_bytes = faiss.serialize_index(self.index)
+                texts, meta = dict(self.texts), dict(self.meta)
+                live = list(texts)
+                new_vectors, saved_vectors = dict(self._new_vectors), self.vectors
+                # Exact vectors of lossy stores are gathered from the snapshot below
+                vectors = None if self.lossy or not live else self.reconstruct(live)
+                state = {
+                    "index_type": self.index_type,
+                    "index_params": self.index_params,
+                    "vector_dtype": self.vector_dtype,
+                    "documents": {doc_id: list(ids) for doc_id, ids in self.documents.items()},
+                    "metadata": dict(self.doc_metadata),
+                    "tombstones": list(self.tombstones),
+                }
+
+            os.makedirs(path, exist_ok=True)
+            index_path = os.path.join(path, INDEX_FILE)
+            with open(index_path + ".tmp", "wb") as f:
+                index_bytes.tofile(f)
+            os.replace(index_path + ".tmp", index_path)
+            write_texts(path, texts, meta)
+            if not live:
+                vectors = np.zeros((0, self.dim))
+            elif vectors is None:
+                vectors = self._lookup_vectors(live, new_vectors, saved_vectors)
+            write_vectors(path, live, vectors, self.vector_dtype)
+            store_path = os.path.join(path, STORE_FILE)
+            with open(store_path + ".tmp", "w") as f:
+                json.dump(state, f)
+            os.replace(store_path + ".tmp", store_path)
+
+            with self.lock:
+                self.vectors = MmapVectors(path, self.dim, self.vector_dtype)
+                # Vectors added while the files were written are not in them yet
+                for i, vector in new_vectors.items():
+                    if self._new_vectors.get(i) is vector:
+                        del self._new_vectors[i]
+                self.stamp = file_stamp(store_path)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = False, **query_options):
+        # Index type and build parameters come from the saved store; only query options can be set.
+        # With mmap, the index, texts and vectors are mapped read-only and shared by all processes.
+        flags = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY if mmap else 0
+        # Taken first: if another process saves while this one reads, the stamp shows it
+        stamp = file_stamp(os.path.join(path, STORE_FILE))
+        index = faiss.read_index(os.path.join(path, INDEX_FILE), flags)
+        with open(os.path.join(path, STORE_FILE)) as f:
+            data = json.load(f)
+        store = cls(dim=index.d, index_type=data["index_type"], vector_dtype=data["vector_dtype"],
+                    **data["index_params"], **query_options)
+        store.index = index
+        store.stamp = stamp
+        store.documents = data["documents"]
+        store.doc_metadata = data.get("metadata", {})
+        store._rebuild_metadata_index()
+        store.tombstones = set(data["tombstones"])
+        # Exact vectors are always read from the mapped file rather than copied into memory
+        store.vectors = MmapVectors(path, index.d, store.vector_dtype)
+        if mmap:
+            store.read_only = True
+            store.texts = MmapTexts(path)
+        else:
+            store.texts, store.meta = read_texts(path)
+        return store
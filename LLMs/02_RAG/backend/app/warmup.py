@@ -0,0 +1,76 @@
+import random
+import threading
+import time
+import traceback
+
+
+class WarmUp:
+    # Runs a slow blocking loader in a background thread, so the worker can serve health checks
+    # meanwhile, and records its progress for the readiness probe. A failed load is retried with
+    # exponential backoff; after max_attempts the state is "failed" for good.
+    def __init__(self, load, max_attempts: int = 5, backoff: float = 1.0, max_backoff: float = 60.0):
+        # load(report) builds whatever the app needs; report(**fields) publishes progress
+        self.load = load
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lock = threading.Lock()
+        self.state = "pending"
+        self.attempts = 0
+        self.progress = {}
+        self.error = None
+        self.started = None
+        self.finished = None
+        self.thread = None
+
+    def start(self):
+        # A daemon thread never holds up shutdown, even halfway through an ingestion
+        self.started = time.time()
+        self.state = "running"
+        self.thread = threading.Thread(target=self._run, name="warm-up", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        try:
+            while True:
+                self.attempts += 1
+                try:
+                    self.load(self.report)
+                    self.state = "ready"
+                    return
+                except Exception as e:
+                    traceback.print_exc()
+                    self.error = f"{type(e).__name__}: {e}"
+                    if self.attempts >= self.max_attempts:
+                        self.state = "failed"
+                        return
+                    self.state = "retrying"
+                    delay = min(self.max_backoff, self.backoff * 2 ** (self.attempts - 1))
+                    time.sleep(delay * random.uniform(0.5, 1.0))
+                    self.state = "running"
+        finally:
+            self.finished = time.time()
+
+    def report(self, **fields):
+        with self.lock:
+            self.progress.update(fields)
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    @property
+    def failed(self) -> bool:
+        # Gave up: only a restart can make this worker ready
+        return self.state == "failed"
+
+    def status(self) -> dict:
+        with self.lock:
+            elapsed = (self.finished or time.time()) - self.started if self.started else 0.0
+            return {
+                "state": self.state,
+                "progress": dict(self.progress),
+                "error": self.error,
+                "attempts": self.attempts,
+                "elapsed_seconds": round(elapsed, 3),
+            }
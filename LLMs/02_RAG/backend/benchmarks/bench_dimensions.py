@@ -0,0 +1,83 @@
+"""Recall/latency/memory of reduced-dimension vectors against full-width exact search.
+
+Two reductions per target dimension:
+  pca       the index projects vectors onto their top principal components (INDEX_PCA_DIM),
+            with and without re-ranking against the exact stored vectors
+  truncate  the first d components, re-normalised: what the embedding API returns for a
+            shortened `dimensions` (EMBEDDING_DIMENSIONS). Only meaningful for real
+            text-embedding-3 vectors, so pass --embeddings for that row to mean anything.
+
+Run from LLMs/02_RAG/backend:  python -m benchmarks.bench_dimensions --embeddings ../index/vectors.bin --dim 1536
+"""
+import argparse
+import time
+import faiss
+import numpy as np
+from app.vector_store import VectorStore
+from benchmarks.bench_index import load_embeddings, make_corpus, recall_at_k
+
+
+def build_store(vectors, **options) -> VectorStore:
+    store = VectorStore(vectors.shape[1], index_type="flat", train_size=len(vectors), **options)
+    store.add_chunks(np.arange(len(vectors)), vectors, [""] * len(vectors))
+    store.train()
+    return store
+
+
+def search_ids(store: VectorStore, queries, k: int):
+    # One query at a time, as /ask does
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = store.search_hits(query, k)
+        latencies.append(time.perf_counter() - start)
+        results.append([hit.id for hit in hits])
+    return np.array(results), np.array(latencies)
+
+
+def truncate(vectors, dim: int):
+    shortened = np.ascontiguousarray(vectors[:, :dim])
+    return shortened / np.maximum(np.linalg.norm(shortened, axis=1, keepdims=True), 1e-12)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=100_000, help="corpus size")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--dims", type=int, nargs="+", default=[768, 512, 256, 128, 64])
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rerank", type=int, default=4)
+    parser.add_argument("--embeddings", help="vectors.bin from an index dir instead of synthetic data")
+    args = parser.parse_args()
+
+    if args.embeddings:
+        vectors = load_embeddings(args.embeddings, args.dim)
+    else:
+        vectors = make_corpus(args.n, args.dim)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.integers(0, len(vectors), args.queries)]
+    queries = queries + 0.1 * rng.standard_normal(queries.shape).astype("float32")
+
+    rows = []
+    full = build_store(vectors)
+    ground_truth, latencies = search_ids(full, queries, args.k)
+    rows.append(("full", args.dim, 0, full, ground_truth, latencies))
+    for dim in args.dims:
+        store = build_store(vectors, pca_dim=dim)
+        for rerank in (0, args.rerank):
+            store.rerank = rerank
+            rows.append(("pca", dim, rerank, store, *search_ids(store, queries, args.k)))
+        store = build_store(truncate(vectors, dim))
+        rows.append(("truncate", dim, 0, store, *search_ids(store, truncate(queries, dim), args.k)))
+
+    print(f"n={len(vectors)} dim={vectors.shape[1]} queries={len(queries)} k={args.k}")
+    print(f"{'method':<10}{'dim':>6}{'rerank':>8}{'index MB':>10}{'recall@k':>10}{'p50 ms':>9}{'p99 ms':>9}")
+    for method, dim, rerank, store, results, latencies in rows:
+        index_mb = faiss.serialize_index(store.index).nbytes / 2**20
+        print(f"{method:<10}{dim:>6}{rerank:>8}{index_mb:>10.1f}{recall_at_k(results, ground_truth):>10.3f}"
+              f"{np.percentile(latencies, 50) * 1000:>9.3f}{np.percentile(latencies, 99) * 1000:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Recall/latency/memory benchmark for the VectorStore index types.
+
+Run from LLMs/02_RAG/backend:  python -m benchmarks.bench_index --n 200000 --dim 384
+"""
+import argparse
+import json
+import os
+import time
+import faiss
+import numpy as np
+from app.vector_store import STORE_FILE, VectorStore
+
+
+def make_corpus(n: int, dim: int, n_clusters: int = 256, seed: int = 0):
+    # Clustered synthetic vectors behave more like real embeddings than uniform noise
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim)).astype("float32")
+    labels = rng.integers(0, n_clusters, n)
+    vectors = centers[labels] + 0.3 * rng.standard_normal((n, dim)).astype("float32")
+    return vectors.astype("float32")
+
+
+def load_embeddings(path: str, dim: int):
+    # vectors.bin of a saved store, stored in the precision recorded next to it (VECTOR_DTYPE)
+    dtype = "float32"
+    store_path = os.path.join(os.path.dirname(path), STORE_FILE)
+    if os.path.exists(store_path):
+        with open(store_path) as f:
+            dtype = json.load(f).get("vector_dtype", dtype)
+    return np.memmap(path, dtype=dtype, mode="r").reshape(-1, dim).astype("float32")
+
+
+def search_all(store: VectorStore, queries, k: int, **params):
+    # One query at a time, as /ask does, so per-query latency is meaningful
+    latencies, results = [], []
+    search_params = store.search_params(**params)
+    for query in queries:
+        start = time.perf_counter()
+        _, indices = store.index.search(query[None, :], k, params=search_params)
+        latencies.append(time.perf_counter() - start)
+        results.append(indices[0])
+    return np.array(results), np.array(latencies)
+
+
+def recall_at_k(results, ground_truth) -> float:
+    hits = sum(len(set(r) & set(g)) for r, g in zip(results, ground_truth))
+    return hits / ground_truth.size
+
+
+def run(vectors, queries, k: int, configs):
+    dim = vectors.shape[1]
+    texts = [""] * len(vectors)
+    ground_truth = None
+    rows = []
+    for index_type, build_options, sweep in configs:
+        store = VectorStore(dim, index_type=index_type, train_size=len(vectors), **build_options)
+        start = time.perf_counter()
+        store.add(vectors, texts)
+        store.train()
+        build_seconds = time.perf_counter() - start
+        memory_mb = faiss.serialize_index(store.index).nbytes / 2**20
+
+        for params in sweep:
+            results, latencies = search_all(store, queries, k, **params)
+            if ground_truth is None:
+                ground_truth = results
+            rows.append({
+                "index": index_type,
+                "params": ", ".join(f"{key}={value}" for key, value in {**build_options, **params}.items()) or "-",
+                "recall": recall_at_k(results, ground_truth),
+                "p50_ms": np.percentile(latencies, 50) * 1000,
+                "p99_ms": np.percentile(latencies, 99) * 1000,
+                "memory_mb": memory_mb,
+                "build_s": build_seconds,
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n", type=int, default=100_000, help="corpus size")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--pq-m", type=int, default=16)
+    parser.add_argument("--embeddings", help="vectors.bin from an index dir instead of synthetic data")
+    args = parser.parse_args()
+
+    if args.embeddings:
+        vectors = load_embeddings(args.embeddings, args.dim)
+    else:
+        vectors = make_corpus(args.n, args.dim)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.integers(0, len(vectors), args.queries)]
+    queries = queries + 0.1 * rng.standard_normal(queries.shape).astype("float32")
+
+    # Flat runs first: it is the exact baseline the others are scored against
+    configs = [
+        ("flat", {}, [{}]),
+        ("ivf_flat", {"nlist": args.nlist}, [{"nprobe": p} for p in (1, 4, 16, 64)]),
+        ("hnsw", {"hnsw_m": 32}, [{"ef_search": ef} for ef in (16, 64, 256)]),
+        ("ivf_pq", {"nlist": args.nlist, "pq_m": args.pq_m}, [{"nprobe": p} for p in (4, 16, 64)]),
+    ]
+    rows = run(vectors, queries, args.k, configs)
+
+    print(f"n={len(vectors)} dim={vectors.shape[1]} queries={len(queries)} k={args.k}")
+    print(f"{'index':<10}{'params':<26}{'recall@k':>10}{'p50 ms':>10}{'p99 ms':>10}{'mem MB':>10}{'build s':>10}")
+    for row in rows:
+        print(f"{row['index']:<10}{row['params']:<26}{row['recall']:>10.3f}{row['p50_ms']:>10.3f}"
+              f"{row['p99_ms']:>10.3f}{row['memory_mb']:>10.1f}{row['build_s']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
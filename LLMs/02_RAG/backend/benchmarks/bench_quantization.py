@@ -0,0 +1,81 @@
+"""Memory/recall benchmark for quantised vector storage with exact re-ranking.
+
+Each configuration is built, saved and reloaded, so re-ranking reads the exact
+vectors from the on-disk vector file as it does in the app.
+
+Run from LLMs/02_RAG/backend:  python -m benchmarks.bench_quantization --n 200000 --dim 1536
+"""
+import argparse
+import os
+import tempfile
+import time
+import faiss
+import numpy as np
+from app.vector_store import VectorStore
+from benchmarks.bench_index import make_corpus, recall_at_k
+
+
+def build_store(vectors, path: str, index_type: str, **options) -> VectorStore:
+    store = VectorStore(vectors.shape[1], index_type=index_type, train_size=len(vectors), **options)
+    ids = np.arange(len(vectors))
+    store.add_chunks(ids, vectors, [""] * len(vectors))
+    store.save(path)
+    return VectorStore.load(path)
+
+
+def search_ids(store: VectorStore, queries, k: int, rerank: int):
+    # Returns the chunk ids of the top k for every query, and per-query latencies
+    store.rerank = rerank
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        _, indices = store.index.search(query[None, :], k * rerank if rerank else k,
+                                        params=store.search_params())
+        if rerank:
+            indices = [store.rerank_candidates(query, indices[0], k)]
+        latencies.append(time.perf_counter() - start)
+        results.append(indices[0])
+    return np.array(results), np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=100_000, help="corpus size")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--pq-m", type=int, default=32)
+    parser.add_argument("--nlist", type=int, default=1024)
+    args = parser.parse_args()
+
+    vectors = make_corpus(args.n, args.dim)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.integers(0, len(vectors), args.queries)]
+    queries = queries + 0.1 * rng.standard_normal(queries.shape).astype("float32")
+
+    configs = [
+        ("flat", {}, [0]),
+        ("sq8", {}, [0, 2, 4]),
+        ("pq", {"pq_m": args.pq_m}, [0, 4, 10]),
+        ("ivf_pq", {"pq_m": args.pq_m, "nlist": args.nlist}, [0, 4, 10]),
+    ]
+    ground_truth = None
+    print(f"n={args.n} dim={args.dim} queries={args.queries} k={args.k}")
+    print(f"{'index':<8}{'rerank':>8}{'index MB':>10}{'bytes/vec':>11}{'vectors MB':>12}{'recall@k':>10}{'p50 ms':>9}{'p99 ms':>9}")
+    with tempfile.TemporaryDirectory() as root:
+        for index_type, options, reranks in configs:
+            path = os.path.join(root, index_type)
+            store = build_store(vectors, path, index_type, **options)
+            index_mb = faiss.serialize_index(store.index).nbytes / 2**20
+            disk_mb = os.path.getsize(os.path.join(path, "vectors.bin")) / 2**20
+            for rerank in reranks:
+                results, latencies = search_ids(store, queries, args.k, rerank)
+                if ground_truth is None:
+                    ground_truth = results
+                print(f"{index_type:<8}{rerank:>8}{index_mb:>10.1f}{index_mb * 2**20 / args.n:>11.1f}"
+                      f"{disk_mb:>12.1f}{recall_at_k(results, ground_truth):>10.3f}"
+                      f"{np.percentile(latencies, 50) * 1000:>9.3f}{np.percentile(latencies, 99) * 1000:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""Offline end-to-end benchmark of the RAG backend.
+
+Embeddings and chat completions come from deterministic local stand-ins with
+configurable latency, so no OpenAI calls are made. Questions go through the
+server's own /ask pipeline (app.main.answer_question) with these stand-ins
+patched in. For every corpus size it reports ingestion throughput, index
+startup time, per-stage /ask latency percentiles and memory, as JSON.
+
+Run from LLMs/02_RAG/backend:
+    python -m benchmarks.bench_rag --sizes small medium --output bench.json
+    python -m benchmarks.bench_rag --sizes small medium --baseline bench.json
+With --baseline, the run exits non-zero if a metric is worse than the baseline
+by more than --tolerance.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import faiss
+import numpy as np
+from app.embeddings.batching import BatchingEmbeddingBackend
+from app.embeddings.fake import FakeEmbeddingBackend
+from app.embeddings.coalescing import CoalescingEmbeddingBackend
+from app.embeddings.hashing import HashingEmbeddingBackend
+from app.fake_chat import FakeAsyncChatClient
+from app.index_cache import load_or_build_vector_store
+
+# Corpus sizes in words
+CORPUS_SIZES = {"small": 20_000, "medium": 200_000, "large": 1_000_000, "xlarge": 5_000_000}
+STAGES = ("embed", "search", "context", "llm", "total")
+# Metric paths compared against a baseline, and whether higher is better
+TRACKED_METRICS = [(("ingest", "chunks_per_s"), True), (("startup", "load_s"), False),
+                   (("startup", "mmap_load_s"), False)] + [
+    (("ask", stage, p), False) for stage in STAGES for p in ("p50", "p99")
+]
+
+
+def make_document(n_words: int, vocabulary: int = 20_000, seed: int = 0) -> str:
+    # Zipf-distributed words in sentences of 8-24 words, a paragraph break every few sentences
+    rng = np.random.default_rng(seed)
+    words = np.array([f"w{i}" for i in range(vocabulary)])
+    ranks = np.minimum(rng.zipf(1.2, n_words), vocabulary) - 1
+    tokens = words[ranks].tolist()
+    parts, i, sentence = [], 0, 0
+    while i < n_words:
+        length = int(rng.integers(8, 25))
+        parts.append(" ".join(tokens[i:i + length]) + ".")
+        parts.append("\n\n" if sentence % 6 == 5 else " ")
+        i += length
+        sentence += 1
+    return "".join(parts)
+
+
+def make_questions(document: str, n: int, seed: int = 1) -> list[str]:
+    # Short word windows taken from the corpus itself
+    rng = np.random.default_rng(seed)
+    words = document.split()
+    starts = rng.integers(0, max(len(words) - 8, 1), n)
+    return [" ".join(words[s:s + 8]) + "?" for s in starts]
+
+
+def rss_mb() -> float:
+    # Current resident set size; falls back to the peak where /proc is unavailable
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def directory_mb(path: str) -> float:
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / 2**20
+
+
+def percentiles(samples) -> dict:
+    samples = np.array(samples) * 1000
+    return {
+        "mean": float(samples.mean()),
+        "p50": float(np.percentile(samples, 50)),
+        "p90": float(np.percentile(samples, 90)),
+        "p99": float(np.percentile(samples, 99)),
+    }
+
+
+async def ask_once(main, question: str) -> dict:
+    # One /ask, timed stage by stage by the server's own StageTimer
+    timer = main.StageTimer("bench")
+    start = time.perf_counter()
+    await main.answer_question({"user_prompt": question}, timer)
+    return {**timer.timings, "total": time.perf_counter() - start}
+
+
+async def run_questions(main, questions, args) -> list[dict]:
+    limit = asyncio.Semaphore(args.concurrency)
+
+    async def one(question):
+        async with limit:
+            return await ask_once(main, question)
+
+    return await asyncio.gather(*(one(question) for question in questions))
+
+
+def run_size(main, name: str, n_words: int, args, root: str) -> dict:
+    document = make_document(n_words)
+    document_path = os.path.join(root, name, "knowledge.txt")
+    index_dir = os.path.join(root, name, "index")
+    os.makedirs(index_dir)
+    with open(document_path, "w") as f:
+        f.write(document)
+    questions = make_questions(document, args.questions)
+    del document
+
+    if args.embedder == "hashing":
+        backend = HashingEmbeddingBackend(dim=args.dim)
+    else:
+        backend = FakeEmbeddingBackend(dim=args.dim, latency=args.embed_latency)
+    embedder = BatchingEmbeddingBackend(backend, max_batch_size=args.embed_batch_size,
+                                        max_in_flight=args.embed_in_flight)
+    build = dict(chunk_size=args.chunk_size, overlap=args.overlap,
+                 index_options={"index_type": args.index_type})
+
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    vector_store = load_or_build_vector_store(document_path, embedder, index_dir, **build)
+    ingest_s = time.perf_counter() - start
+    chunks = len(vector_store.texts)
+    embed_calls = getattr(backend, "calls", None)
+    rss_built = rss_mb()
+    del vector_store
+
+    # Startup: a worker finding an up-to-date index on disk
+    start = time.perf_counter()
+    vector_store = load_or_build_vector_store(document_path, embedder, index_dir, **build)
+    load_s = time.perf_counter() - start
+    start = time.perf_counter()
+    mapped_store = load_or_build_vector_store(document_path, embedder, index_dir, mmap=True, **build)
+    mmap_load_s = time.perf_counter() - start
+    del mapped_store
+
+    # Serve this store as the default collection, embedding questions like the server does
+    main.embedder = CoalescingEmbeddingBackend(embedder)
+    main.collections.register(main.Settings.DEFAULT_COLLECTION, vector_store, index_dir)
+    main.answer_caches.clear()
+    asyncio.run(run_questions(main, questions[:args.warmup], args))
+    start = time.perf_counter()
+    timings = asyncio.run(run_questions(main, questions, args))
+    ask_s = time.perf_counter() - start
+
+    return {
+        "words": n_words,
+        "chunks": chunks,
+        "ingest": {"seconds": ingest_s, "chunks_per_s": chunks / ingest_s, "embed_calls": embed_calls},
+        "startup": {"load_s": load_s, "mmap_load_s": mmap_load_s},
+        "ask": {
+            "questions": len(questions),
+            "concurrency": args.concurrency,
+            "questions_per_s": len(questions) / ask_s,
+            **{stage: percentiles([t.get(stage, 0.0) for t in timings]) for stage in STAGES},
+        },
+        "memory": {
+            "rss_before_mb": rss_before,
+            "rss_built_mb": rss_built,
+            "rss_mb": rss_mb(),
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "index_disk_mb": directory_mb(index_dir),
+        },
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    # Human-readable descriptions of every tracked metric that regressed beyond the tolerance
+    regressions = []
+    for size, result in report["results"].items():
+        base = baseline["results"].get(size)
+        if base is None:
+            continue
+        for path, higher_is_better in TRACKED_METRICS:
+            value, reference = result, base
+            for key in path:
+                value, reference = value[key], reference[key]
+            change = (value - reference) / reference if reference else 0.0
+            worse = -change if higher_is_better else change
+            if worse > tolerance:
+                regressions.append(f"{size} {'.'.join(path)}: {reference:.4g} -> {value:.4g} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["small", "medium"], choices=list(CORPUS_SIZES))
+    parser.add_argument("--embedder", default="fake", choices=["fake", "hashing"],
+                        help="fake: random vectors with simulated latency; hashing: real local n-gram embeddings")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--index-type", default="flat")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--overlap", type=int, default=50)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--token-budget", type=int, default=3000)
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="seconds per embedding call")
+    parser.add_argument("--embed-batch-size", type=int, default=512)
+    parser.add_argument("--embed-in-flight", type=int, default=4)
+    parser.add_argument("--llm-first-token", type=float, default=0.0, help="seconds before the first token")
+    parser.add_argument("--llm-token-latency", type=float, default=0.0, help="seconds per generated token")
+    parser.add_argument("--answer-tokens", type=int, default=50)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="JSON report of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args()
+
+    # app.main builds OpenAI clients and prints its configuration on import; keep stdout clean for the
+    # report, and give the clients a placeholder key since they are replaced before any call
+    os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+    with contextlib.redirect_stdout(sys.stderr):
+        from app import main, rag
+    rag.async_client = FakeAsyncChatClient(args.llm_first_token, args.llm_token_latency, args.answer_tokens)
+    main.Settings.SEARCH_K = args.k
+    main.Settings.CONTEXT_TOKEN_BUDGET = args.token_budget
+    # Every question runs the whole pipeline: warm-up questions are asked again, and would be cached
+    main.Settings.ANSWER_CACHE_SIZE = 0
+
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "faiss": faiss.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory() as root:
+        for size in args.sizes:
+            print(f"benchmarking {size} ({CORPUS_SIZES[size]} words)", file=sys.stderr)
+            report["results"][size] = run_size(main, size, CORPUS_SIZES[size], args, root)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Query latency of a sharded flat index against the number of shards.
+
+Run from LLMs/02_RAG/backend:  python -m benchmarks.bench_shards --n 1000000 --dim 384 --shards 1 2 4 8
+"""
+import argparse
+import time
+import faiss
+import numpy as np
+from app.sharded_store import create_store
+from .bench_index import make_corpus
+
+
+def build(vectors, shards: int, docs: int):
+    # Vectors are split into documents, so each shard holds whole documents as in the app
+    store = create_store(shards=shards, dim=vectors.shape[1], index_type="flat")
+    ids = np.arange(len(vectors), dtype="int64")
+    for doc, (doc_ids, doc_vectors) in enumerate(zip(np.array_split(ids, docs), np.array_split(vectors, docs))):
+        store.add_chunks(doc_ids.tolist(), doc_vectors, [""] * len(doc_ids), doc_id=f"doc{doc}")
+    return store
+
+
+def search_all(store, queries, k: int):
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = store.search_hits(query, k)
+        latencies.append(time.perf_counter() - start)
+        results.append([hit.id for hit in hits])
+    return results, np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n", type=int, default=500_000, help="corpus size")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--docs", type=int, default=256, help="documents the corpus is split into")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    # Each shard is searched by one thread; keep FAISS from also spreading a single search
+    faiss.omp_set_num_threads(1)
+    vectors = make_corpus(args.n, args.dim)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.integers(0, len(vectors), args.queries)]
+    queries = queries + 0.1 * rng.standard_normal(queries.shape).astype("float32")
+
+    print(f"n={len(vectors)} dim={args.dim} queries={len(queries)} k={args.k}")
+    print(f"{'shards':>8}{'p50 ms':>10}{'p99 ms':>10}{'speedup':>10}{'same top-k':>12}")
+    baseline = None
+    for shards in args.shards:
+        store = build(vectors, shards, args.docs)
+        results, latencies = search_all(store, queries, args.k)
+        p50 = np.percentile(latencies, 50) * 1000
+        if baseline is None:
+            baseline = (p50, results)
+        same = np.mean([r == b for r, b in zip(results, baseline[1])])
+        print(f"{shards:>8}{p50:>10.3f}{np.percentile(latencies, 99) * 1000:>10.3f}"
+              f"{baseline[0] / p50:>10.2f}{same:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
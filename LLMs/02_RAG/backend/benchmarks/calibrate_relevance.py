@@ -0,0 +1,80 @@
+"""Fit RELEVANCE_MAX_DISTANCE on a labelled question set.
+
+Questions are embedded with the app's configured embedder and searched in a persisted index. The
+threshold is the best-hit distance that still lets --min-recall of the answerable questions through;
+everything farther is answered "I don't know" without an LLM call.
+
+The question file is JSON lines: {"question": "...", "answerable": true}
+
+Run from LLMs/02_RAG/backend:  python -m benchmarks.calibrate_relevance questions.jsonl --min-recall 0.95
+"""
+import argparse
+import json
+import numpy as np
+from app.config import Settings
+from app.index_cache import QUERY_OPTIONS
+from app.sharded_store import load_store
+
+
+def load_questions(path: str):
+    with open(path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [row["question"] for row in rows], np.array([bool(row["answerable"]) for row in rows])
+
+
+def best_distances(vector_store, embedder, questions, k: int):
+    embeddings = embedder.embed(questions)
+    hits = vector_store.search_hits_many(embeddings, k)
+    return np.array([row[0].distance if row else np.inf for row in hits]), hits
+
+
+def fit_threshold(distances, answerable, min_recall: float) -> float:
+    # Smallest threshold that keeps min_recall of the answerable questions
+    return float(np.quantile(distances[answerable], min_recall, method="higher"))
+
+
+def largest_gaps(hits, answerable):
+    # Distance jumps inside the top k of answerable questions, to help choose RELEVANCE_DROP_OFF
+    gaps = [b.distance - a.distance for row, ok in zip(hits, answerable) if ok for a, b in zip(row, row[1:])]
+    return np.array(gaps) if gaps else np.zeros(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("questions", help="JSON lines of {question, answerable}")
+    parser.add_argument("--index-dir", default=Settings.INDEX_DIR)
+    parser.add_argument("--k", type=int, default=Settings.SEARCH_K)
+    parser.add_argument("--min-recall", type=float, default=0.95,
+                        help="fraction of answerable questions that must still reach the LLM")
+    args = parser.parse_args()
+
+    # The same embedder and query options (rerank, nprobe, ef_search) as the server, so distances
+    # are on the same scale: with re-ranking on, the server compares exact distances, not code distances
+    from app.main import embedder, index_options
+
+    questions, answerable = load_questions(args.questions)
+    if not answerable.any():
+        parser.error("the question set needs answerable questions")
+    query_options = {key: value for key, value in index_options.items() if key in QUERY_OPTIONS}
+    vector_store = load_store(args.index_dir, mmap=True, **query_options)
+    distances, hits = best_distances(vector_store, embedder, questions, args.k)
+    threshold = fit_threshold(distances, answerable, args.min_recall)
+
+    kept = distances <= threshold
+    recall = kept[answerable].mean()
+    skipped = (~kept[~answerable]).mean() if (~answerable).any() else float("nan")
+    print(f"questions={len(questions)} answerable={answerable.sum()} k={args.k}")
+    print(f"best distance, answerable:   p50={np.median(distances[answerable]):.4f} max={distances[answerable].max():.4f}")
+    if (~answerable).any():
+        print(f"best distance, unanswerable: p50={np.median(distances[~answerable]):.4f} "
+              f"min={distances[~answerable].min():.4f}")
+    print(f"answerable reaching the LLM: {recall:.3f}")
+    print(f"unanswerable answered locally: {skipped:.3f}")
+    print(f"questions answered locally: {(~kept).mean():.3f}")
+    print(f"top-k distance gap, answerable: p50={np.median(largest_gaps(hits, answerable)):.4f} "
+          f"p95={np.percentile(largest_gaps(hits, answerable), 95):.4f}")
+    print(f"RELEVANCE_MAX_DISTANCE={threshold:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import numpy as np
+from app import answer_cache
+from app.answer_cache import AnswerCache
+
+
+def embedding(seed, dim=8):
+    return np.random.default_rng(seed).standard_normal(dim).astype("float32")
+
+
+def test_exact_hit_ignores_case_spacing_and_punctuation():
+    cache = AnswerCache(dim=8)
+    cache.put("What is RAG?", embedding(0), "answer")
+    assert cache.get("  what is   rag") == "answer"
+    assert cache.get("what is faiss?") is None
+
+
+def test_semantic_hit_needs_a_close_embedding():
+    cache = AnswerCache(dim=8, similarity_threshold=0.95)
+    cache.put("What is RAG?", embedding(0), "answer")
+    assert cache.get_similar(embedding(0) + 0.01) == "answer"
+    assert cache.get_similar(embedding(1)) is None
+    assert cache.stats() == {"entries": 1, "exact_hits": 0, "semantic_hits": 1, "misses": 1}
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "monotonic", lambda: now[0])
+    cache = AnswerCache(dim=8, ttl_seconds=60)
+    cache.put("question", embedding(0), "answer")
+    now[0] += 59
+    assert cache.get("question") == "answer"
+    now[0] += 2
+    assert cache.get("question") is None
+    assert cache.get_similar(embedding(0)) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_a_new_index_version_clears_the_cache():
+    cache = AnswerCache(dim=8)
+    cache.sync(1)
+    cache.put("question", embedding(0), "answer")
+    cache.sync(1)
+    assert cache.get("question") == "answer"
+    cache.sync(2)
+    assert cache.get("question") is None
+    assert cache.get_similar(embedding(0)) is None
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = AnswerCache(dim=8, max_entries=2)
+    cache.put("first", embedding(0), 1)
+    cache.put("second", embedding(1), 2)
+    cache.get("first")
+    cache.put("third", embedding(2), 3)
+    assert cache.get("second") is None
+    assert (cache.get("first"), cache.get("third")) == (1, 3)
@@ -0,0 +1,113 @@
+import asyncio
+import threading
+import pytest
+from app.embeddings.batching import BatchingEmbeddingBackend, InFlightLimit
+from app.embeddings.fake import FakeEmbeddingBackend, FakeTransientError
+
+
+class FlakyBackend(FakeEmbeddingBackend):
+    # Fails the first `failures` calls with a transient error
+    def __init__(self, failures: int):
+        super().__init__(dim=8)
+        self.failures = failures
+
+    def embed(self, texts: list[str]):
+        if self.calls < self.failures:
+            self.calls += 1
+            raise FakeTransientError("simulated transient embedding failure")
+        return super().embed(texts)
+
+
+class CountingBackend(FakeEmbeddingBackend):
+    # Records the most calls that were running at once
+    def __init__(self):
+        super().__init__(dim=8, latency=0.01)
+        self.running = 0
+        self.peak = 0
+
+    def _enter(self):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+
+    def _exit(self):
+        with self.lock:
+            self.running -= 1
+
+    def embed(self, texts: list[str]):
+        self._enter()
+        try:
+            return super().embed(texts)
+        finally:
+            self._exit()
+
+    async def aembed(self, texts: list[str]):
+        self._enter()
+        try:
+            return await super().aembed(texts)
+        finally:
+            self._exit()
+
+
+def texts(n):
+    return [f"text number {i}" for i in range(n)]
+
+
+def test_batches_respect_count_and_token_limits():
+    batching = BatchingEmbeddingBackend(FakeEmbeddingBackend(dim=8), max_batch_size=3, max_batch_tokens=10)
+    batches = batching.make_batches(["a" * 12] * 7 + ["b" * 40])
+    assert [len(batch) for batch in batches] == [2, 2, 2, 1, 1]
+    assert sum(batches, []) == list(range(8))
+
+
+def test_vectors_come_back_in_input_order():
+    backend = FakeEmbeddingBackend(dim=8)
+    batching = BatchingEmbeddingBackend(backend, max_batch_size=4, max_in_flight=3)
+    expected = [backend.embed_one(text).tolist() for text in texts(30)]
+    assert batching.embed(texts(30)) == expected
+    assert asyncio.run(batching.aembed(texts(30))) == expected
+    assert backend.calls == 16
+
+
+def test_transient_errors_are_retried():
+    backend = FlakyBackend(failures=2)
+    batching = BatchingEmbeddingBackend(backend, max_retries=2, backoff=0)
+    assert len(batching.embed(texts(3))) == 3
+    assert backend.calls == 3
+
+    backend = FlakyBackend(failures=3)
+    with pytest.raises(FakeTransientError):
+        BatchingEmbeddingBackend(backend, max_retries=2, backoff=0).embed(texts(3))
+
+
+def test_in_flight_limit_is_shared_by_every_caller():
+    backend = CountingBackend()
+    batching = BatchingEmbeddingBackend(backend, max_batch_size=1, max_in_flight=2)
+    callers = [threading.Thread(target=batching.embed, args=(texts(4),)) for _ in range(3)]
+    callers.append(threading.Thread(target=lambda: asyncio.run(batching.aembed(texts(4)))))
+    for caller in callers:
+        caller.start()
+    for caller in callers:
+        caller.join()
+    assert backend.calls == 16
+    assert backend.peak == 2
+
+
+def test_waiter_cancelled_after_the_hand_over_passes_the_slot_on():
+    limit = InFlightLimit(1)
+
+    async def scenario():
+        await limit.__aenter__()
+        waiter = asyncio.create_task(limit.__aenter__())
+        await asyncio.sleep(0)
+        # The slot goes to the waiter, which is cancelled before it gets to run
+        limit.release()
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        await asyncio.wait_for(limit.__aenter__(), timeout=1)
+        await limit.__aexit__(None, None, None)
+
+    asyncio.run(scenario())
+    assert limit.active == 0
@@ -0,0 +1,36 @@
+import io
+import pytest
+from app.chunker import chunk_text, iter_chunks
+
+TEXT = "The  quick brown fox.\nIt jumps over\tthe lazy dog. " * 40
+
+
+def chunks(text, chunk_size=10, overlap=3, **options):
+    return list(iter_chunks(io.StringIO(text), chunk_size, overlap, **options))
+
+
+def test_offsets_point_at_the_chunk_words_in_the_source():
+    for chunk in chunks(TEXT):
+        assert TEXT[chunk.start:chunk.end].split() == chunk.text.split()
+
+
+def test_small_reads_give_the_same_chunks():
+    # Words cut at a block boundary are carried into the next read
+    assert chunks(TEXT) == list(iter_chunks(io.StringIO(TEXT), 10, 3, read_size=7))
+
+
+def test_consecutive_chunks_share_the_overlap():
+    result = chunks(TEXT)
+    for first, second in zip(result, result[1:]):
+        assert first.text.split()[-3:] == second.text.split()[:3]
+    assert " ".join(chunk_text(TEXT, 10, 0)).split() == TEXT.split()
+
+
+def test_snapping_ends_chunks_at_a_sentence():
+    result = chunks(TEXT, snap_to_sentence=True)
+    assert all(chunk.text.endswith((".", "!", "?")) for chunk in result[:-1])
+
+
+def test_overlap_must_be_smaller_than_a_chunk():
+    with pytest.raises(ValueError):
+        chunks(TEXT, chunk_size=5, overlap=5)
@@ -0,0 +1,106 @@
+import io
+import pytest
+from app.chunker import iter_chunks
+from app.collection_manager import CollectionManager
+from app.embeddings.fake import FakeEmbeddingBackend
+from app.ingest import ingest_document
+
+embedder = FakeEmbeddingBackend(dim=16)
+
+
+def worker(root, budget=1 << 30, **options):
+    # One CollectionManager per gunicorn worker, all over the same directory
+    return CollectionManager(str(root), memory_budget_bytes=budget, **options)
+
+
+def upsert(doc_id, text, metadata=None):
+    def change(vector_store):
+        return ingest_document(vector_store, doc_id, iter_chunks(io.StringIO(text), 20, 5), embedder.embed,
+                               metadata=metadata)
+    return change
+
+
+def delete(doc_id):
+    return lambda vector_store: vector_store.delete_document(doc_id)
+
+
+def test_update_creates_and_saves_a_collection(tmp_path):
+    collections = worker(tmp_path)
+    assert not collections.exists("docs")
+    collections.update("docs", upsert("a", "alpha beta gamma"), create=True)
+    assert collections.exists("docs")
+    assert collections.names() == ["docs"]
+    assert list(worker(tmp_path).get("docs").documents) == ["a"]
+
+
+def test_missing_collection_is_not_created_without_asking(tmp_path):
+    collections = worker(tmp_path)
+    with pytest.raises(KeyError):
+        collections.get("docs")
+    with pytest.raises(KeyError):
+        collections.update("docs", delete("a"))
+    with pytest.raises(ValueError):
+        collections.update("../docs", upsert("a", "alpha"), create=True)
+    assert collections.names() == []
+
+
+def test_failed_first_write_leaves_no_collection(tmp_path):
+    collections = worker(tmp_path)
+    with pytest.raises(ValueError):
+        collections.update("docs", upsert("a", "alpha", metadata="not an object"), create=True)
+    assert not collections.exists("docs")
+    with pytest.raises(KeyError):
+        collections.get("docs")
+
+
+def test_least_recently_used_collections_are_evicted(tmp_path):
+    collections = worker(tmp_path)
+    for name in ("one", "two", "three"):
+        collections.update(name, upsert("a", " ".join([name] * 10)), create=True)
+    size = collections.get("one").memory_bytes()
+
+    # Room for one store: loading the next evicts the least recently used one
+    evicted = []
+    collections = worker(tmp_path, budget=size * 3 // 2, on_evict=evicted.append)
+    for name in ("one", "two", "three", "one"):
+        assert list(collections.get(name).documents) == ["a"]
+    assert evicted == ["one", "two", "three"]
+    assert collections.stats()["loads"] == 4
+    assert list(collections.stats()["loaded"]) == ["one"]
+
+
+def test_workers_see_each_others_writes(tmp_path):
+    first, second = worker(tmp_path), worker(tmp_path)
+    first.update("docs", upsert("a", "alpha beta gamma"), create=True)
+    assert set(second.get("docs").documents) == {"a"}
+
+    # The second worker writes on top of the first one's document instead of over it
+    second.update("docs", upsert("b", "delta epsilon"))
+    assert set(first.get("docs").documents) == {"a", "b"}
+    first.update("docs", delete("a"))
+    assert set(second.get("docs").documents) == {"b"}
+    assert set(worker(tmp_path).get("docs").documents) == {"b"}
+    assert second.stats()["reloads"] >= 1
+
+
+def test_reload_drops_derived_caches(tmp_path):
+    evicted = []
+    first, second = worker(tmp_path), worker(tmp_path, on_evict=evicted.append)
+    first.update("docs", upsert("a", "alpha"), create=True)
+    second.get("docs")
+    first.update("docs", upsert("b", "beta"))
+    second.get("docs")
+    assert evicted == ["docs"]
+
+
+def test_failed_write_is_not_kept_in_memory(tmp_path):
+    collections = worker(tmp_path)
+    collections.update("docs", upsert("a", "alpha"), create=True)
+
+    def half_done(vector_store):
+        ingest_document(vector_store, "b", iter_chunks(io.StringIO("beta"), 20, 5), embedder.embed)
+        raise RuntimeError("embedding API gave up")
+
+    with pytest.raises(RuntimeError):
+        collections.update("docs", half_done)
+    assert set(collections.get("docs").documents) == {"a"}
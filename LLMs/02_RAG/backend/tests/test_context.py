@@ -0,0 +1,81 @@
+import io
+from app.chunker import iter_chunks
+from app.context import distinct_hits, drop_near_duplicates, fit_budget, merge_hits, pack_context, select_relevant
+from app.vector_store import SearchHit
+
+SOURCE = " ".join(f"w{i}" for i in range(100))
+
+
+def hits(chunk_size=20, overlap=5, doc_id="doc"):
+    return [SearchHit(id=i, text=chunk.text, doc_id=doc_id, start=chunk.start, end=chunk.end)
+            for i, chunk in enumerate(iter_chunks(io.StringIO(SOURCE), chunk_size, overlap))]
+
+
+def test_overlapping_chunks_merge_back_into_their_source_text():
+    chunks = hits()
+    passages = merge_hits([chunks[2], chunks[0], chunks[1]])
+    assert passages == [(0, " ".join(f"w{i}" for i in range(50)))]
+
+
+def test_repetitive_text_merges_by_source_offsets():
+    # Adjacent chunks of a repeated table row look alike at many overlaps; only the offsets tell
+    row = "| id | name | total |"
+    source = " ".join([row] * 40)
+    for chunk_size, overlap in ((100, 20), (12, 0)):
+        chunks = [SearchHit(id=i, text=chunk.text, doc_id="doc", start=chunk.start, end=chunk.end)
+                  for i, chunk in enumerate(iter_chunks(io.StringIO(source), chunk_size, overlap))]
+        (_, text), = merge_hits(chunks[:2])
+        assert text == source[chunks[0].start:chunks[1].end]
+
+
+def test_chunks_apart_stay_separate_and_keep_their_rank():
+    chunks = hits()
+    passages = merge_hits([chunks[4], chunks[0], SearchHit(id=99, text="no offsets")])
+    assert passages == [(0, chunks[4].text), (1, chunks[0].text), (2, "no offsets")]
+
+
+def test_the_same_span_of_another_document_is_not_merged():
+    first, second = hits(doc_id="a")[0], hits(doc_id="b")[1]
+    assert len(merge_hits([first, second])) == 2
+
+
+def test_near_duplicates_are_dropped_in_favour_of_the_better_ranked():
+    text = " ".join(f"w{i}" for i in range(50))
+    assert drop_near_duplicates([text, text + " extra", "something else entirely"]) == \
+           [text, "something else entirely"]
+
+
+def test_copies_in_other_documents_take_one_of_the_k_slots():
+    footer = " ".join(f"legal{i}" for i in range(30))
+    ranked = [SearchHit(id=1, text=footer, doc_id="a"), SearchHit(id=2, text=footer, doc_id="b"),
+              SearchHit(id=3, text=footer + " extra", doc_id="c")] + hits(doc_id="d")[:3]
+    assert [hit.id for hit in distinct_hits(ranked, k=3)] == [1, 0, 1]
+    assert [hit.doc_id for hit in distinct_hits(ranked, k=3)] == ["a", "d", "d"]
+
+
+def test_passages_are_cut_to_the_token_budget():
+    passages = fit_budget([SOURCE, SOURCE], token_budget=150)
+    assert passages[0] == SOURCE
+    assert SOURCE.startswith(passages[1]) and len(passages[1]) < len(SOURCE)
+    assert fit_budget([SOURCE, SOURCE], token_budget=20) == []
+
+
+def test_pack_context_reports_the_tokens_saved():
+    passages, stats = pack_context(hits()[:3])
+    assert len(passages) == 1
+    assert stats["chunks"] == 3 and stats["passages"] == 1
+    assert stats["tokens_saved"] > 0
+
+
+def scored(*distances):
+    return [SearchHit(id=i, text=f"chunk {i}", distance=distance) for i, distance in enumerate(distances)]
+
+
+def test_hits_beyond_the_distance_limit_are_not_relevant():
+    assert [hit.id for hit in select_relevant(scored(0.2, 0.5, 0.9), max_distance=0.6)] == [0, 1]
+    assert select_relevant(scored(0.9, 1.0), max_distance=0.6) == []
+
+
+def test_relevance_cuts_at_the_first_large_drop_off():
+    assert [hit.id for hit in select_relevant(scored(0.1, 0.15, 0.6, 0.65), drop_off=0.3)] == [0, 1]
+    assert len(select_relevant(scored(0.1, 0.15, 0.6, 0.65))) == 4
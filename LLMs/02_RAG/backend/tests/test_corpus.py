@@ -0,0 +1,105 @@
+import pytest
+from app.corpus import expand_paths, ingest_corpus
+from app.embeddings.fake import FakeEmbeddingBackend
+from app.index_cache import load_or_build_vector_store, read_manifest
+from app.sharded_store import load_store
+
+embedder = FakeEmbeddingBackend(dim=16)
+
+
+def write_corpus(root, count=5, name="file"):
+    for i in range(count):
+        path = root / ("sub" if i % 2 else "") / f"{name}{i}.txt"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(" ".join(f"{root.name}{name}{i} word{j}" for j in range(60)))
+
+
+def ingest(root, index_dir, **options):
+    return ingest_corpus(expand_paths([str(root)]), embedder, str(index_dir), root=str(root), chunk_size=20,
+                         overlap=5, processes=2, embed_workers=2, checkpoint_every=2, **options)
+
+
+def test_corpus_is_ingested_and_checkpointed(tmp_path):
+    write_corpus(tmp_path / "corpus")
+    totals = ingest(tmp_path / "corpus", tmp_path / "index")
+    assert totals["ingested"] == totals["files"] == 5
+    assert totals["embedded"] == totals["chunks"] > 5
+
+    store = load_store(str(tmp_path / "index"))
+    assert set(store.documents) == {"corpus:file0.txt", "corpus:sub/file1.txt", "corpus:file2.txt",
+                                    "corpus:sub/file3.txt", "corpus:file4.txt"}
+    assert set(read_manifest(str(tmp_path / "index"))["documents"]) == set(store.documents)
+
+
+def test_rerun_ingests_only_changed_files(tmp_path):
+    write_corpus(tmp_path / "corpus")
+    ingest(tmp_path / "corpus", tmp_path / "index")
+    (tmp_path / "corpus" / "file2.txt").write_text("completely new text")
+    totals = ingest(tmp_path / "corpus", tmp_path / "index")
+    assert totals["unchanged"] == 4
+    assert totals["ingested"] == 1
+    store = load_store(str(tmp_path / "index"))
+    assert store.texts[store.documents["corpus:file2.txt"][0]] == "completely new text"
+
+
+def test_interrupted_run_resumes_from_its_last_checkpoint(tmp_path):
+    write_corpus(tmp_path / "corpus")
+    checkpoints = []
+
+    def crash_after_first_checkpoint(phase=None, **totals):
+        if phase == "checkpoint":
+            checkpoints.append(totals["ingested"])
+        elif phase == "ingesting" and checkpoints:
+            raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        ingest(tmp_path / "corpus", tmp_path / "index", progress=crash_after_first_checkpoint)
+    assert checkpoints == [2]
+
+    totals = ingest(tmp_path / "corpus", tmp_path / "index")
+    assert totals["unchanged"] == 2
+    assert totals["ingested"] == 3
+    assert len(load_store(str(tmp_path / "index")).documents) == 5
+
+
+def test_delete_missing_removes_files_no_longer_given(tmp_path):
+    write_corpus(tmp_path / "corpus")
+    ingest(tmp_path / "corpus", tmp_path / "index")
+    (tmp_path / "corpus" / "file4.txt").unlink()
+    assert ingest(tmp_path / "corpus", tmp_path / "index")["deleted"] == 0
+    totals = ingest(tmp_path / "corpus", tmp_path / "index", delete_missing=True)
+    assert totals["deleted"] == 1 and totals["ingested"] == 0
+    assert "corpus:file4.txt" not in load_store(str(tmp_path / "index")).documents
+
+
+def test_delete_missing_keeps_other_corpora_and_the_server_document(tmp_path):
+    # The server's knowledge file and two corpora share one index; one corpus has its own knowledge.txt
+    knowledge = tmp_path / "knowledge.txt"
+    knowledge.write_text("server knowledge base text")
+    load_or_build_vector_store(str(knowledge), embedder, str(tmp_path / "index"), chunk_size=20, overlap=5)
+    write_corpus(tmp_path / "a", count=3)
+    (tmp_path / "a" / "knowledge.txt").write_text("a corpus file with the same name")
+    write_corpus(tmp_path / "b", count=2, name="other")
+    ingest(tmp_path / "a", tmp_path / "index")
+    ingest(tmp_path / "b", tmp_path / "index")
+
+    (tmp_path / "a" / "file0.txt").unlink()
+    assert ingest(tmp_path / "a", tmp_path / "index", delete_missing=True)["deleted"] == 1
+    assert set(load_store(str(tmp_path / "index")).documents) == {
+        "knowledge.txt", "corpus:knowledge.txt", "corpus:sub/file1.txt", "corpus:file2.txt",
+        "corpus:other0.txt", "corpus:sub/other1.txt",
+    }
+    phases = []
+    load_or_build_vector_store(str(knowledge), embedder, str(tmp_path / "index"), chunk_size=20, overlap=5,
+                               progress=lambda phase=None, **fields: phases.append(phase))
+    assert "loading" in phases and "ingesting" not in phases
+
+
+def test_same_paths_under_another_root_are_refused(tmp_path):
+    write_corpus(tmp_path / "a", count=2)
+    write_corpus(tmp_path / "b", count=2)
+    ingest(tmp_path / "a", tmp_path / "index")
+    with pytest.raises(ValueError):
+        ingest(tmp_path / "b", tmp_path / "index")
+    store = load_store(str(tmp_path / "index"))
+    assert store.texts[store.documents["corpus:file0.txt"][0]].startswith("afile0")
@@ -0,0 +1,44 @@
+import numpy as np
+from app.embeddings.hashing import HashingEmbeddingBackend
+
+
+def cosine(a, b):
+    return float(np.dot(a, b))
+
+
+def test_vectors_are_deterministic_and_normalised():
+    texts = ["the cat sat on the mat", "stock prices fell sharply", ""]
+    first = HashingEmbeddingBackend(dim=256).embed(texts)
+    second = HashingEmbeddingBackend(dim=256).embed(list(reversed(texts)))[::-1]
+    assert np.allclose(first, second)
+    assert np.allclose(np.linalg.norm(first[:2], axis=1), 1)
+    assert not first[2].any()
+
+
+def test_related_texts_are_closer_than_unrelated_ones():
+    backend = HashingEmbeddingBackend(dim=1024)
+    cat, cats, stocks = backend.embed(["the cat sat on the mat", "a cat sitting on mats", "stock prices fell"])
+    assert cosine(cat, cats) > cosine(cat, stocks) + 0.2
+
+
+def test_word_order_only_counts_through_bigrams():
+    texts = ["alpha beta gamma", "gamma beta alpha"]
+    unordered = HashingEmbeddingBackend(dim=256, word_bigrams=False).embed(texts)
+    assert np.allclose(unordered[0], unordered[1])
+    ordered = HashingEmbeddingBackend(dim=256).embed(texts)
+    assert not np.allclose(ordered[0], ordered[1])
+
+
+def test_idf_weights_and_settings_change_the_model_name():
+    corpus = ["common word here", "common word there", "rare token"]
+    plain = HashingEmbeddingBackend(dim=64)
+    fitted = HashingEmbeddingBackend(dim=64).fit(corpus)
+    assert fitted.idf.shape == (64,)
+    assert len({plain.model_name, fitted.model_name, HashingEmbeddingBackend(dim=128).model_name}) == 3
+
+
+def test_vocabulary_reset_keeps_vectors_the_same():
+    backend = HashingEmbeddingBackend(dim=64, max_vocabulary=3)
+    first = backend.embed(["one two three four five"])
+    backend.embed(["six seven eight nine"])
+    assert np.allclose(backend.embed(["one two three four five"]), first)
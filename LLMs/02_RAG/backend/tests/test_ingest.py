@@ -0,0 +1,110 @@
+import io
+import numpy as np
+import pytest
+from app.chunker import iter_chunks
+from app.embeddings.fake import FakeEmbeddingBackend
+from app.ingest import ingest_document
+from app.sharded_store import create_store
+from app.vector_store import VectorStore
+
+embedder = FakeEmbeddingBackend(dim=16)
+
+
+def chunks(text, chunk_size=20, overlap=5):
+    return iter_chunks(io.StringIO(text), chunk_size, overlap)
+
+
+def words(start, stop):
+    return " ".join(f"w{i}" for i in range(start, stop))
+
+
+def test_upsert_embeds_only_new_chunks():
+    store = VectorStore()
+    first = ingest_document(store, "a", chunks(words(0, 100)), embedder.embed)
+    assert first["embedded"] == first["chunks"] > 1
+
+    # Same text again: nothing to embed, nothing retired
+    again = ingest_document(store, "a", chunks(words(0, 100)), embedder.embed)
+    assert again == {**first, "embedded": 0}
+
+    # Changing the tail re-embeds only the chunks it touches and retires the old ones
+    edited = ingest_document(store, "a", chunks(words(0, 90) + " changed ending"), embedder.embed)
+    assert 0 < edited["embedded"] < edited["chunks"]
+    assert edited["removed"] > 0
+    assert len(store.documents["a"]) == edited["chunks"]
+    assert set(store.texts) == set(store.documents["a"])
+
+
+def test_vectors_are_reused_from_another_store():
+    old = VectorStore()
+    ingest_document(old, "a", chunks(words(0, 100)), embedder.embed)
+    store = VectorStore()
+    result = ingest_document(store, "a", chunks(words(0, 110)), embedder.embed, reuse=old)
+    assert 0 < result["embedded"] < result["chunks"]
+    assert np.allclose(store.reconstruct(old.documents["a"][:2]), old.reconstruct(old.documents["a"][:2]))
+
+
+def test_upsert_replaces_metadata():
+    store = VectorStore()
+    ingest_document(store, "a", chunks(words(0, 30)), embedder.embed, metadata={"team": "x"})
+    ingest_document(store, "a", chunks(words(0, 30)), embedder.embed, metadata={"team": "y"})
+    assert store.matching_documents({"team": "x"}) == set()
+    assert store.matching_documents({"team": "y"}) == {"a"}
+
+
+def test_repeated_chunks_are_dropped_before_embedding():
+    store = VectorStore()
+    paragraph = words(0, 20)
+    text = " ".join([paragraph, paragraph, words(0, 19) + " w99"])
+    result = ingest_document(store, "a", chunks(text, overlap=0), embedder.embed, dedup_threshold=0.8)
+    assert result["chunks"] == result["embedded"] == 1
+    assert result["duplicates"] == 2
+
+    # Without a threshold every chunk is kept
+    result = ingest_document(VectorStore(), "a", chunks(text, overlap=0), embedder.embed)
+    assert result["chunks"] == 3 and result["duplicates"] == 0
+
+
+def test_duplicates_are_dropped_within_a_document_only():
+    store = VectorStore()
+    paragraph = words(0, 20)
+    result = ingest_document(store, "a", chunks(" ".join([paragraph] * 3), overlap=0), embedder.embed,
+                             dedup_threshold=0.9)
+    assert result["chunks"] == 1
+    assert result["duplicates"] == 2
+
+    # Another document with the same text keeps its own chunk, so its filters and deletes work
+    other = ingest_document(store, "b", chunks(paragraph), embedder.embed, metadata={"team": "b"},
+                            dedup_threshold=0.9)
+    assert other["chunks"] == 1 and other["duplicates"] == 0
+    query = embedder.embed([paragraph])[0]
+    assert [hit.doc_id for hit in store.search_hits(query, k=3, filter={"team": "b"})] == ["b"]
+    store.delete_document("a")
+    assert [hit.doc_id for hit in store.search_hits(query, k=3)] == ["b"]
+
+
+@pytest.mark.parametrize("options", [
+    {"index_type": "flat"},
+    {"index_type": "sq8"},
+    {"index_type": "ivf_flat", "nlist": 2},
+    {"index_type": "flat", "shards": 2},
+])
+def test_boilerplate_shared_by_documents_is_embedded_once(options):
+    counting = FakeEmbeddingBackend(dim=16)
+    store = create_store(train_size=50, **options)
+    footer = words(500, 520)
+    a = ingest_document(store, "a", chunks(words(0, 20) + " " + footer, overlap=0), counting.embed,
+                        dedup_threshold=0.9)
+    b = ingest_document(store, "b", chunks(words(100, 120) + " " + footer, overlap=0), counting.embed,
+                        dedup_threshold=0.9)
+    assert (a["embedded"], b["embedded"], b["chunks"]) == (2, 1, 2)
+    assert counting.texts_embedded == 3
+    if options["index_type"] == "ivf_flat":
+        # Looking the vector up must not train an index that is still collecting vectors
+        assert not store.ready
+
+    # Each document keeps its own copy of the chunk, so a delete leaves the other one's
+    query = counting.embed([footer])[0]
+    assert {hit.doc_id for hit in store.search_hits(query, k=2)} == {"a", "b"}
+    store.delete_document("a")
+    assert store.search_hits(query, k=1)[0].doc_id == "b"
@@ -0,0 +1,39 @@
+from app.metrics import Counter, Histogram, StageTimer
+
+
+def test_counter_renders_one_line_per_label_set():
+    counter = Counter("requests_total", "Requests", ("outcome",))
+    counter.inc(outcome="hit")
+    counter.inc(2, outcome="hit")
+    counter.inc(outcome="miss")
+    assert counter.render() == [
+        "# HELP requests_total Requests",
+        "# TYPE requests_total counter",
+        'requests_total{outcome="hit"} 3',
+        'requests_total{outcome="miss"} 1',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value)
+    lines = histogram.render()
+    assert 'latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{le="1"} 2' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in lines
+    assert "latency_seconds_sum 5.55" in lines
+    assert "latency_seconds_count 3" in lines
+
+
+def test_stage_timer_builds_a_server_timing_header():
+    timer = StageTimer("test")
+    with timer.stage("retrieve"):
+        pass
+    with timer.stage("retrieve"):
+        pass
+    with timer.stage("generate"):
+        pass
+    header = timer.finish("generated")
+    assert [part.split(";")[0] for part in header.split(", ")] == ["retrieve", "generate", "total"]
+    assert all(part.split(";dur=")[1] for part in header.split(", "))
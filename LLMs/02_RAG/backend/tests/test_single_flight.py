@@ -0,0 +1,56 @@
+import asyncio
+from app.single_flight import SingleFlight
+
+
+def test_identical_concurrent_calls_share_one_run():
+    calls = []
+
+    async def work(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key.upper()
+
+    async def main():
+        flight = SingleFlight("test")
+        results = await asyncio.gather(*(flight.do(key, lambda key=key: work(key)) for key in "aaab"))
+        assert len(flight) == 0
+        # Once finished, the same key runs again
+        again = await flight.do("a", lambda: work("a"))
+        return results, again
+
+    results, again = asyncio.run(main())
+    assert results == ["A", "A", "A", "B"]
+    assert again == "A"
+    assert calls == ["a", "b", "a"]
+
+
+def test_a_cancelled_caller_does_not_cancel_the_others():
+    async def main():
+        flight = SingleFlight("test")
+        started = asyncio.Event()
+
+        async def work():
+            started.set()
+            await asyncio.sleep(0.01)
+            return "done"
+
+        first = asyncio.ensure_future(flight.do("key", work))
+        second = asyncio.ensure_future(flight.do("key", work))
+        await started.wait()
+        first.cancel()
+        return await second, first.cancelled()
+
+    assert asyncio.run(main()) == ("done", True)
+
+
+def test_errors_reach_every_caller():
+    async def main():
+        flight = SingleFlight("test")
+
+        async def work():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        return await asyncio.gather(flight.do("key", work), flight.do("key", work), return_exceptions=True)
+
+    assert [type(result) for result in asyncio.run(main())] == [ValueError, ValueError]
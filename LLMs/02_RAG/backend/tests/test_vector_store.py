@@ -0,0 +1,248 @@
+import threading
+import numpy as np
+import pytest
+from app.sharded_store import create_store, load_store
+from app.vector_store import FilterError, VectorStore
+
+
+def vectors(n, dim=16, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype("float32")
+
+
+def fill(store, docs=4, per_doc=25, dim=16):
+    # Document d holds chunk ids d * 1000 + i, with the i-th vector of its block
+    data = vectors(docs * per_doc, dim)
+    for d in range(docs):
+        ids = [d * 1000 + i for i in range(per_doc)]
+        block = data[d * per_doc:(d + 1) * per_doc]
+        store.add_chunks(ids, block, [f"doc{d} chunk{i}" for i in range(per_doc)], doc_id=f"doc{d}")
+        store.set_document(f"doc{d}", ids, {"team": "a" if d % 2 == 0 else "b", "year": 2020 + d})
+    return data
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw", "sq8"])
+def test_search_finds_added_chunk(index_type):
+    store = VectorStore(index_type=index_type, train_size=50)
+    data = fill(store)
+    hits = store.search_hits(data[30], k=1)
+    assert hits[0].id == 1005
+    assert hits[0].doc_id == "doc1"
+    assert hits[0].text == "doc1 chunk5"
+
+
+def test_set_document_retires_dropped_chunks():
+    store = VectorStore()
+    data = fill(store)
+    removed = store.set_document("doc1", [1000, 1001])
+    assert removed == 23
+    assert store.documents["doc1"] == [1000, 1001]
+    assert 1005 not in store.texts
+    assert all(hit.id != 1005 for hit in store.search_hits(data[30], k=5))
+
+
+def test_delete_document_removes_chunks_and_metadata():
+    store = VectorStore()
+    data = fill(store)
+    assert store.delete_document("doc2") == 25
+    assert store.delete_document("doc2") == 0
+    assert "doc2" not in store.documents
+    assert store.matching_documents({"team": "a"}) == {"doc0"}
+    assert all(hit.doc_id != "doc2" for hit in store.search_hits(data[55], k=10))
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw", "ivf_flat"])
+def test_filter_restricts_search_to_matching_documents(index_type):
+    store = VectorStore(index_type=index_type, nlist=4, train_size=50, nprobe=4)
+    data = fill(store)
+    hits = store.search_hits(data[30], k=10, filter={"team": "a"})
+    assert len(hits) == 10
+    assert {hit.doc_id for hit in hits} <= {"doc0", "doc2"}
+    hits = store.search_hits(data[30], k=10, filter={"team": ["a", "b"], "year": {"gte": 2021, "lt": 2023}})
+    assert {hit.doc_id for hit in hits} <= {"doc1", "doc2"}
+    assert hits[0].id == 1005
+
+
+@pytest.mark.parametrize("filter", [
+    {"year": {"after": 2020}},
+    {"year": {"gte": [2021]}},
+    {"team": [["a"]]},
+    ["team", "a"],
+])
+def test_malformed_filters_are_rejected(filter):
+    store = VectorStore()
+    data = fill(store)
+    with pytest.raises(FilterError):
+        store.search_hits(data[0], k=3, filter=filter)
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw", "ivf_flat"])
+def test_tombstones_are_compacted_away(index_type):
+    store = VectorStore(index_type=index_type, nlist=4, train_size=50, compact_ratio=0.3)
+    data = fill(store)
+    store.train()
+    # One document of four is under the compaction ratio: tombstoned, still in the index
+    store.delete_document("doc0")
+    assert len(store.tombstones) == 25
+    assert store.index.ntotal == 100
+    assert all(hit.doc_id != "doc0" for hit in store.search_hits(data[3], k=10))
+    # A second one crosses it: the index is compacted
+    store.delete_document("doc1")
+    assert not store.tombstones
+    assert store.index.ntotal == 50
+    assert store.search_hits(data[60], k=1)[0].id == 2010
+
+
+def test_readding_a_tombstoned_chunk_makes_it_live_again():
+    store = VectorStore()
+    data = fill(store)
+    store.delete_document("doc0")
+    store.add_chunks([0], data[:1], ["back"], doc_id="doc0")
+    store.set_document("doc0", [0])
+    assert store.search_hits(data[0], k=1)[0].text == "back"
+
+
+@pytest.mark.parametrize("options", [
+    {"index_type": "flat"},
+    {"index_type": "hnsw"},
+    {"index_type": "sq8", "vector_dtype": "float16", "rerank": 4},
+    {"index_type": "flat", "shards": 3},
+])
+def test_save_load_round_trip(tmp_path, options):
+    store = create_store(train_size=50, **options)
+    data = fill(store)
+    store.delete_document("doc3")
+    store.save(tmp_path)
+
+    loaded = load_store(tmp_path, **({"rerank": 4} if options.get("rerank") else {}))
+    assert loaded.documents == store.documents
+    assert loaded.doc_metadata == store.doc_metadata
+    assert sorted(loaded.texts) == sorted(store.texts)
+    assert loaded.chunk_meta(1005)[0] == "doc1"
+    for q in (0, 30, 55):
+        assert [hit.id for hit in loaded.search_hits(data[q], k=5)] == \
+               [hit.id for hit in store.search_hits(data[q], k=5)]
+    tolerance = 1e-2 if options.get("vector_dtype") == "float16" else 1e-6
+    assert np.allclose(loaded.reconstruct([2007]), data[57:58], atol=tolerance)
+
+
+def test_sharded_store_answers_like_a_single_store():
+    single, sharded = VectorStore(), create_store(shards=3)
+    data = fill(single)
+    fill(sharded)
+    assert sum(1 for shard in sharded.shards if shard.documents) > 1
+    for q in (0, 30, 55, 99):
+        assert [hit.id for hit in sharded.search_hits(data[q], k=5, filter={"team": "b"})] == \
+               [hit.id for hit in single.search_hits(data[q], k=5, filter={"team": "b"})]
+    sharded.delete_document("doc1")
+    assert all(hit.doc_id != "doc1" for hit in sharded.search_hits(data[30], k=10))
+
+
+def test_empty_shards_of_trained_types_save_and_search(tmp_path):
+    store = create_store(shards=4, index_type="ivf_flat", nlist=4, train_size=50)
+    data = vectors(40)
+    store.add_chunks(list(range(40)), data, [str(i) for i in range(40)], doc_id="only")
+    assert store.search_hits(data[7], k=1)[0].id == 7
+    store.save(tmp_path)
+    assert load_store(tmp_path).search_hits(data[7], k=1)[0].id == 7
+
+
+def test_loaded_store_keeps_tombstones_until_compaction(tmp_path):
+    store = VectorStore(compact_ratio=0.9)
+    data = fill(store)
+    store.delete_document("doc0")
+    store.save(tmp_path)
+    loaded = VectorStore.load(tmp_path)
+    assert loaded.tombstones == set(range(25))
+    assert all(hit.doc_id != "doc0" for hit in loaded.search_hits(data[3], k=10))
+
+
+def test_mmap_store_is_read_only(tmp_path):
+    store = VectorStore()
+    data = fill(store)
+    store.save(tmp_path)
+    loaded = VectorStore.load(tmp_path, mmap=True)
+    assert loaded.texts[1005] == "doc1 chunk5"
+    assert len(loaded.texts) == 100 and 4000 not in loaded.texts
+    assert loaded.search_hits(data[30], k=1)[0].id == 1005
+    with pytest.raises(RuntimeError):
+        loaded.delete_document("doc0")
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw"])
+def test_pca_store_searches_in_the_reduced_space(tmp_path, index_type):
+    store = create_store(index_type=index_type, pca_dim=8, rerank=8)
+    data = fill(store)
+    assert store.needs_training and not store.ready
+    store.train()
+    assert store.index.d == 16
+    assert store.search_hits(data[30], k=1)[0].id == 1005
+    store.save(tmp_path)
+    assert load_store(tmp_path, rerank=8).search_hits(data[55], k=1)[0].id == 2005
+
+
+def test_pca_dim_must_reduce_the_dimension():
+    store = VectorStore(pca_dim=16)
+    fill(store)
+    with pytest.raises(ValueError):
+        store.train()
+
+
+def test_searches_run_while_a_save_writes_files(tmp_path, monkeypatch):
+    import app.vector_store as vector_store_module
+
+    store = VectorStore()
+    data = fill(store)
+    writing, release = threading.Event(), threading.Event()
+    write_texts = vector_store_module.write_texts
+
+    def slow_write_texts(*args):
+        writing.set()
+        release.wait(5)
+        write_texts(*args)
+
+    monkeypatch.setattr(vector_store_module, "write_texts", slow_write_texts)
+    saver = threading.Thread(target=store.save, args=(tmp_path,))
+    saver.start()
+    try:
+        assert writing.wait(5)
+        result = []
+        searcher = threading.Thread(target=lambda: result.append(store.search_hits(data[30], k=1)))
+        searcher.start()
+        searcher.join(2)
+        assert result and result[0][0].id == 1005
+    finally:
+        release.set()
+        saver.join()
+    assert VectorStore.load(tmp_path).documents == store.documents
+
+
+def test_writes_go_ahead_while_a_search_runs():
+    store = VectorStore(compact_ratio=1.0)
+    data = fill(store)
+    searching, release = threading.Event(), threading.Event()
+    index = store.index
+
+    class SlowIndex:
+        def __getattr__(self, name):
+            return getattr(index, name)
+
+        def search(self, *args, **kwargs):
+            searching.set()
+            release.wait(5)
+            return index.search(*args, **kwargs)
+
+    store.index = SlowIndex()
+    result = []
+    searcher = threading.Thread(target=lambda: result.append(store.search_hits(data[0], k=3)))
+    searcher.start()
+    try:
+        assert searching.wait(5)
+        deleter = threading.Thread(target=store.delete_document, args=("doc0",))
+        deleter.start()
+        deleter.join(2)
+        assert not deleter.is_alive()
+    finally:
+        release.set()
+        searcher.join()
+    # The chunks deleted while the search ran are not returned
+    assert result[0] and all(hit.doc_id != "doc0" for hit in result[0])
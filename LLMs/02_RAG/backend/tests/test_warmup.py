@@ -0,0 +1,38 @@
+from app.warmup import WarmUp
+
+
+def run(load, **options):
+    warm_up = WarmUp(load, backoff=0.001, **options)
+    warm_up.start()
+    warm_up.thread.join(5)
+    return warm_up
+
+
+def test_progress_is_reported_until_ready():
+    warm_up = run(lambda report: report(phase="loading", documents=3))
+    assert warm_up.ready
+    status = warm_up.status()
+    assert status["state"] == "ready" and status["attempts"] == 1
+    assert status["progress"] == {"phase": "loading", "documents": 3}
+
+
+def test_a_failed_load_is_retried():
+    failures = [RuntimeError("index locked"), OSError("disk busy")]
+
+    def load(report):
+        if failures:
+            raise failures.pop(0)
+
+    warm_up = run(load)
+    assert warm_up.ready
+    assert warm_up.attempts == 3
+
+
+def test_warm_up_fails_for_good_after_max_attempts():
+    def load(report):
+        raise RuntimeError("no knowledge file")
+
+    warm_up = run(load, max_attempts=2)
+    assert warm_up.failed and not warm_up.ready
+    assert warm_up.status()["error"] == "RuntimeError: no knowledge file"
+    assert warm_up.attempts == 2
@@ -1,6 +1,7 @@
 import streamlit as st
 import requests
 import uuid
+import json
 
 st.set_page_config(layout="wide")
 
@@ -44,23 +45,40 @@ system_prompt="You are a helpful assistant "
 user_prompt=st.text_area("User Prompt", value="", height=100)
 
 
+def read_events(response):
+    # Parse server-sent events into (event, data) pairs
+    event = None
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: "):
+            yield event, json.loads(line[len("data: "):])
+
+
 if st.button("Run"):
     # call API to evaluate the platform based on the selected criteria
-    url = "http://localhost:8000/ask"
+    url = "http://localhost:8000/ask/stream"
     payload = {
         "system_prompt": system_prompt,
         "user_prompt": user_prompt
     }
 
-    headers={"Content-Type": "application/json", "Accept": "application/json"}
+    headers={"Content-Type": "application/json", "Accept": "text/event-stream"}
              
     st.write(payload)
 
-    response = requests.post(url, json=payload, headers=headers)
+    response = requests.post(url, json=payload, headers=headers, stream=True)
 
     if response.status_code == 200:
-        result = response.json()
-        st.write(result['answer'])
-        # st.write(result['sources'])
+        events = read_events(response)
+        for event, data in events:
+            if event == "sources":
+                with st.expander("Sources"):
+                    for source in data:
+                        st.write(source)
+                break
+
+        # Render answer tokens as they arrive
+        st.write_stream(data for event, data in events if event == "token")
 
     st.success("Process completed!")
\ No newline at end of file